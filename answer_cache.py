@@ -0,0 +1,156 @@
+# answer_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from bm25_index import query_terms
+from embedding_cache import normalize_text
+
+# Off by default: a hit returns a final financial answer without any LLM call, and the
+# similarity threshold has not been calibrated on real traffic
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "false").lower() == "true"
+# Minimum cosine similarity between a new question and a cached one to reuse its answer.
+# e5 scores cluster high, so similarity alone does not separate questions that differ only
+# in a month or a department; `key_terms` must also match (see below).
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+def key_terms(question):
+    """
+    Every word of the question except stopwords, lower-cased. Two questions can only
+    share an answer when these are the same, so rephrasings that differ in stopwords,
+    case, punctuation or word order match, but "marketing spend in january" and
+    "sales spend in january" do not.
+    """
+    return frozenset(query_terms(question))
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Answers to earlier questions, matched to new questions by embedding similarity.
+
+    Only standalone questions belong here: the caller stores and looks up the
+    first question of a thread, whose answer does not depend on earlier turns.
+    A match also needs the same `key_terms`, so "January R&D budget" never gets
+    the answer to "February R&D budget".
+
+    Entries belong to one corpus version, read from `version()` (e.g. the file
+    index's counter that push/delete bump). When the version changes every entry
+    is dropped, so answers never outlive the data they were generated from.
+    Entries also expire after `ttl` seconds, and the least recently used ones are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(self, embeddings, version, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, enabled=ANSWER_CACHE):
+        self.embeddings = embeddings
+        self.version = version
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._corpus_version = None
+        # Unit vectors of all entries stacked in one matrix, rebuilt after the entries change
+        self._keys = []
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _sync_version(self):
+        corpus_version = self.version()
+        if corpus_version != self._corpus_version:
+            self._entries.clear()
+            self._matrix = None
+            self._corpus_version = corpus_version
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _candidates(self, vector):
+        # Called with self._lock held: (key, score) of entries above the threshold, best first,
+        # from one matrix-vector product over all entries
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([self._entries[key]["vector"] for key in self._keys]) if self._keys else None
+        if self._matrix is None:
+            return []
+        scores = self._matrix @ vector
+        above = np.flatnonzero(scores >= self.threshold)
+        return [(self._keys[i], float(scores[i])) for i in above[np.argsort(-scores[above])]]
+
+    def lookup(self, question):
+        """Return the cached answer for the most similar question above the threshold, or None."""
+        if not self.enabled:
+            return None
+        key = normalize_text(question).lower()
+        terms = key_terms(question)
+        vector = _unit(self.embeddings.embed_query(question))
+        with self._lock:
+            self._sync_version()
+            self._expire(time.monotonic())
+            if key in self._entries:
+                best_key, best_score = key, 1.0
+            else:
+                best_key, best_score = next(
+                    ((entry_key, score) for entry_key, score in self._candidates(vector)
+                     if self._entries[entry_key]["terms"] == terms),
+                    (None, None),
+                )
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            entry = self._entries[best_key]
+        print(f"Answer cache hit ({best_score:.3f}): {question!r} ~ {entry['question']!r}")
+        return entry["answer"]
+
+    def store(self, question, answer):
+        if not self.enabled or not answer:
+            return
+        key = normalize_text(question).lower()
+        vector = _unit(self.embeddings.embed_query(question))
+        with self._lock:
+            self._sync_version()
+            self._entries[key] = {
+                "question": question,
+                "terms": key_terms(question),
+                "vector": vector,
+                "answer": answer,
+                "created": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "corpus_version": self._corpus_version,
+        }
@@ -1,20 +1,38 @@
-import streamlit as st
 import asyncio
+import streamlit as st
+from event_loop import get_app_loop
 from session_manager import generate_new_session_id
-from main import execute_workflow, initialize_retriever_tool
+from main import stream_workflow, initialize_retriever_tool, warm_up
 from chroma_db_init import push_files_to_chroma, fetch_files_in_vector_db, delete_vectors_from_chroma
 from postgresSQL import (
-    fetch_conversation_by_thread,
-    fetch_all_conversations,
+    fetch_conversation_messages,
+    fetch_conversation_page,
     delete_conversation,
     save_uploaded_file,
     delete_uploaded_file,
     fetch_uploaded_files,
+    pool_metrics,
 )
 
 # Set page configuration
 st.set_page_config(page_title="💬 Finance Chatbot with Agentic RAG", layout="wide")
 
+# Number of conversations listed in the sidebar per page
+SIDEBAR_PAGE_SIZE = 30
+
+# One event loop per app process, shared by all reruns and sessions, so the pooled
+# checkpointer and async LLM clients survive between chat turns
+app_loop = get_app_loop()
+
+
+@st.cache_resource
+def start_warm_up():
+    """Load the models and tools once per process, in the background, while the page renders."""
+    return app_loop.submit(asyncio.to_thread(warm_up))
+
+
+start_warm_up()
+
 if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = 0
 
@@ -23,12 +41,12 @@ vector_db_files = fetch_files_in_vector_db()
 def update_key():
     st.session_state.uploader_key += 1
 
-# Load conversations from PostgreSQL on page load
+# Load the first page of conversations on page load; a thread's history is only
+# fetched when it is opened (st.session_state['conversations'] caches opened threads)
 if 'conversations_loaded' not in st.session_state:
-    conversations = fetch_all_conversations()
-    st.session_state['conversations'] = {
-        conv['thread_id']: fetch_conversation_by_thread(conv['thread_id']) for conv in conversations
-    }
+    st.session_state['thread_summaries'] = fetch_conversation_page(limit=SIDEBAR_PAGE_SIZE)
+    st.session_state['has_more_threads'] = len(st.session_state['thread_summaries']) == SIDEBAR_PAGE_SIZE
+    st.session_state['conversations'] = {}
     st.session_state['conversations_loaded'] = True
 
 # Automatically start a new conversation if none exists
@@ -69,10 +87,11 @@ def display_selected_files():
 
 def display_vectordb_files():
     if vector_db_files:
-            for i, file_name in enumerate(vector_db_files):
+            for i, file_row in enumerate(vector_db_files):
+                file_name = file_row['file_name']
                 cols = st.columns([0.8, 0.2])  # Create columns for file name and delete button
                 with cols[0]:
-                    st.write(file_name)  # Display file name
+                    st.write(f"{file_name} ({file_row['chunk_count']} chunks)")  # Display file name and chunk count
                 with cols[1]:
                     # Delete button for each file
                     if st.button("❌", key=f"delete_vector_file_{i}"):
@@ -91,24 +110,37 @@ with st.sidebar:
         st.session_state['current_thread_id'] = new_thread_id
         st.session_state['conversations'][new_thread_id] = []
 
-    # List all conversations loaded from the database
+    # List conversations: threads started in this session first, then the pages loaded from the database
     st.subheader("Conversations")
+    listed_threads = {summary['thread_id']: summary.get('preview') for summary in st.session_state['thread_summaries']}
+    session_threads = [thread_id for thread_id in st.session_state['conversations'] if thread_id not in listed_threads]
     keys_to_delete = []
-    for thread_id in st.session_state['conversations'].keys():
+    for thread_id, preview in [(t, None) for t in session_threads] + list(listed_threads.items()):
+        label = f"{thread_id[:8]} · {preview[:40]}" if preview else f"View Conversation {thread_id[:8]}"
         cols = st.columns([0.8, 0.2])
         with cols[0]:
-            if st.button(f"View Conversation {thread_id[:8]}", key=f"view_{thread_id}"):
+            if st.button(label, key=f"view_{thread_id}"):
                 st.session_state['current_thread_id'] = thread_id
-                st.session_state['conversations'][thread_id] = fetch_conversation_by_thread(thread_id)
+                # Full history is loaded lazily, only for the thread being opened
+                st.session_state['conversations'][thread_id] = fetch_conversation_messages(thread_id)
 
         with cols[1]:
             if st.button("❌", key=f"delete_{thread_id}"):
                 keys_to_delete.append(thread_id)
 
+    if st.session_state['has_more_threads'] and st.button("Load more conversations"):
+        next_page = fetch_conversation_page(limit=SIDEBAR_PAGE_SIZE, before=st.session_state['thread_summaries'][-1])
+        st.session_state['thread_summaries'].extend(next_page)
+        st.session_state['has_more_threads'] = len(next_page) == SIDEBAR_PAGE_SIZE
+        st.rerun()
+
     # Perform deletions after iteration
     for thread_id in keys_to_delete:
         delete_conversation(thread_id)
-        del st.session_state['conversations'][thread_id]
+        st.session_state['conversations'].pop(thread_id, None)
+        st.session_state['thread_summaries'] = [
+            summary for summary in st.session_state['thread_summaries'] if summary['thread_id'] != thread_id
+        ]
 
     # File Upload Section
     st.subheader("Upload CSV File")
@@ -175,95 +207,70 @@ with st.sidebar:
 
     display_vectordb_files()        
 
+    # Connection pool checkouts and wait times, for spotting pool exhaustion under load
+    with st.expander("Database pool"):
+        metrics = pool_metrics()
+        if metrics is None:
+            st.caption("Pool metrics are unavailable: the database cannot be reached.")
+        else:
+            st.json(metrics)
+
 def display_conversation_streamlit(conversation_data):
     """Display conversation in Streamlit using human and assistant messages."""
-    user_message = None
-    final_assistant_message = None
-
-    for checkpoint in conversation_data:
-        metadata = checkpoint['metadata']
-        writes = metadata.get("writes", {})
-
-        if writes is not None:  # Add this check to ensure 'writes' is not None
-            if '__start__' in writes:
-                user_message = writes['__start__']['messages'][0][1]
-                with st.chat_message("human"):
-                    st.write("H", user_message)
-
-            if 'generate' in writes:
-                final_assistant_message = writes['generate']['messages'][0]
-                with st.chat_message("assistant"):
-                    st.write("W tool" ,final_assistant_message)
-            elif 'agent' in writes:
-                if writes['agent']['messages'][0]['kwargs'].get('content') is not "":
-                    if 'messages' in writes['agent']:
-                        final_assistant_message = writes['agent']['messages'][0]['kwargs'].get('content', 'No content available')
-                        with st.chat_message("assistant"):
-                            st.write("With tool" ,final_assistant_message)
-
-# Load conversations from PostgreSQL on page load
-if 'conversations_loaded' not in st.session_state:
-    conversations = fetch_all_conversations()
-    st.session_state['conversations'] = {
-        conv['thread_id']: fetch_conversation_by_thread(conv['thread_id']) for conv in conversations
-    }
-    st.session_state['conversations_loaded'] = True
+    for message in conversation_data:
+        with st.chat_message(message['role']):
+            st.write(message['content'])
 
 # Select a conversation to display
 if 'current_thread_id' in st.session_state and st.session_state['current_thread_id']:
     thread_id = st.session_state['current_thread_id']
     st.subheader(f"Conversation: {thread_id[:8]}")
-    conversation_data = st.session_state['conversations'].get(thread_id, [])
+    if thread_id not in st.session_state['conversations']:
+        st.session_state['conversations'][thread_id] = fetch_conversation_messages(thread_id)
+    conversation_data = st.session_state['conversations'][thread_id]
     display_conversation_streamlit(conversation_data)
 
+def stream_response(prompt, thread_id, status, placeholder):
+    """Render a streamed workflow turn into Streamlit placeholders and return the final answer."""
+    answer = ""
+    token_node = None
+    # The workflow runs on the app's persistent loop; events are rendered from the script thread
+    for event in app_loop.iterate(stream_workflow(prompt, thread_id)):
+        if event["type"] == "node":
+            status.caption(f"Running: {event['node']}")
+        elif event["type"] == "token":
+            # A different node starting to stream means the earlier text was not the answer
+            if event["node"] != token_node:
+                answer, token_node = "", event["node"]
+            answer += event["content"]
+            placeholder.markdown(answer + "▌")
+        else:
+            answer = event["content"]
+    status.empty()
+    placeholder.markdown(answer)
+    return answer
+
 # Handle new messages from the user
 prompt = st.chat_input("Type your message here...")
 if prompt:
     thread_id = st.session_state.get('current_thread_id', None)
     if thread_id:
-        # Structure the user message
-        user_message_structure = {
-            "metadata": {
-                "writes": {
-                    "__start__": {
-                        "messages": [["human", prompt]]
-                    }
-                }
-            }
-        }
-        
-        # Append the user's message structure to the conversation in session state
-        st.session_state["conversations"][thread_id].append(user_message_structure)
+        # Append the user's message to the conversation in session state
+        st.session_state["conversations"][thread_id].append({"role": "human", "content": prompt})
 
         # Display the user's message immediately
         with st.chat_message("human"):
             st.write(prompt)
 
-        # Fetch assistant's response
+        # Stream assistant's response: node progress in a caption, tokens as they arrive
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = asyncio.run(execute_workflow(prompt, thread_id))
-                assistant_message_content = response["messages"][-1].content
-
-                # Structure the assistant's message
-                assistant_message_structure = {
-                    "metadata": {
-                        "writes": {
-                            "agent": {
-                                "messages": [
-                                    {
-                                        "kwargs": {
-                                            "content": assistant_message_content if assistant_message_content else "No content available"
-                                        }
-                                    }
-                                ]
-                            }
-                        }
-                    }
-                }
-
-                # Append the assistant's message structure to the conversation in session state
-                st.session_state["conversations"][thread_id].append(assistant_message_structure)
-
-                # Display the assistant's message immediately
-                st.write(assistant_message_content)
\ No newline at end of file
+            status = st.empty()
+            status.caption("Thinking...")
+            placeholder = st.empty()
+            assistant_message_content = stream_response(prompt, thread_id, status, placeholder)
+
+            # Append the assistant's message to the conversation in session state
+            st.session_state["conversations"][thread_id].append({
+                "role": "assistant",
+                "content": assistant_message_content if assistant_message_content else "No content available",
+            })
@@ -0,0 +1,133 @@
+"""Build time, incremental update cost and query latency of the BM25 index.
+
+Indexes generated ledger rows (one chunk per row, formatted like csv_chunking's
+"row" strategy) in ingest-sized batches, the way IngestPipeline feeds it, then
+times re-indexing and deleting a batch, dropping a whole file, and BM25
+queries: ones with an exact vendor name and ones made only of common terms
+(department and month), which fall back to intersecting posting lists.
+
+It first indexes the app's own small CSVs with the default chunking (a few
+chunks each), where the document frequency cutoffs do not apply, and checks
+that exact-token questions still find their chunk.
+
+    python benchmarks/bench_bm25_index.py --chunks 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from bench_csv_chunking import HEADER, generate_rows
+from bm25_index import BM25Index
+from csv_chunking import chunk_csv, format_row
+from hybrid_retriever import reciprocal_rank_fusion
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+# (CSV file, [(question, text the top chunk must contain)]) for the small-corpus case
+SMALL_CORPUS = [
+    (os.path.join(ROOT, "dummy_data_for_llm_testing.csv"),
+     [("Vendor B expenses", "Vendor B"), ("January R&D budget", "January,Research & Development,R&D")]),
+    (os.path.join(ROOT, "uploaded_files", "zain_financial_data.csv"),
+     [("TXN72127", "TXN72127"), ("Gym Membership amount", "Gym Membership")]),
+]
+
+
+def percentiles(samples_ms):
+    return f"p50 {np.percentile(samples_ms, 50):7.2f} ms  p95 {np.percentile(samples_ms, 95):7.2f} ms"
+
+
+def small_corpus(k):
+    """Index the app's sample CSVs with the default chunking and query them."""
+    with tempfile.TemporaryDirectory() as workdir:
+        index = BM25Index(workdir)
+        texts = {}
+        for path, _ in SMALL_CORPUS:
+            chunks = chunk_csv(path)
+            ids = [f"{os.path.basename(path)}-{i}" for i in range(len(chunks))]
+            index.add(os.path.basename(path), ids, [chunk.page_content for chunk in chunks])
+            texts.update(zip(ids, (chunk.page_content for chunk in chunks)))
+        print(f"small corpus: {index.count()} chunks from {len(SMALL_CORPUS)} files")
+        for _, questions in SMALL_CORPUS:
+            for question, expected in questions:
+                start = time.perf_counter()
+                results = index.search(question, k)
+                elapsed = (time.perf_counter() - start) * 1000
+                found = bool(results) and expected in texts[results[0][0]]
+                print(f"  {question!r:<24} {len(results)} results, top chunk has {expected!r}: {found}  ({elapsed:.2f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=20)
+    args = parser.parse_args()
+
+    small_corpus(args.k)
+
+    rows = generate_rows(args.chunks, seed=4)
+    rows_per_file = args.chunks // args.files
+    with tempfile.TemporaryDirectory() as workdir:
+        index = BM25Index(workdir)
+
+        start = time.perf_counter()
+        sampled = []
+        batch_ids, batch_texts = [], []
+        for i, row in enumerate(rows):
+            batch_ids.append(f"chunk-{i}")
+            batch_texts.append(format_row(HEADER, row))
+            if i % max(args.chunks // args.queries, 1) == 0:
+                sampled.append(row)
+            if len(batch_ids) == args.batch_size or i == args.chunks - 1:
+                index.add(f"file-{i // rows_per_file}", batch_ids, batch_texts)
+                batch_ids, batch_texts = [], []
+        build_seconds = time.perf_counter() - start
+        size_mib = sum(
+            os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir)
+        ) / 2**20
+        print(f"build: {args.chunks:,} chunks in {build_seconds:.1f}s "
+              f"({args.chunks / build_seconds:,.0f} chunks/s, batch {args.batch_size}), {size_mib:,.0f} MiB on disk")
+
+        question_sets = {
+            # A rare token (the vendor) selects the candidates
+            "vendor + month": [f"What were the expenses for {row[3]} in {row[0]}?" for row in sampled],
+            # Only common tokens: answered by intersecting their posting lists
+            "department + month": [f"What was the {row[1]} budget in {row[0]}?" for row in sampled],
+        }
+        for name, questions in question_sets.items():
+            latencies = []
+            for question in questions:
+                start = time.perf_counter()
+                lexical = [chunk_id for chunk_id, _ in index.search(question, args.k)]
+                reciprocal_rank_fusion([lexical, lexical[::-1]])
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"query {name:<18} (top {args.k} + RRF): {percentiles(latencies)} over {len(questions)} questions")
+
+        rng = random.Random(5)
+        updates, deletes = [], []
+        for _ in range(20):
+            ids = [f"chunk-{rng.randrange(args.chunks)}" for _ in range(args.batch_size)]
+            start = time.perf_counter()
+            index.add("file-0", ids, [f"Vendor: Vendor updated {chunk_id}" for chunk_id in ids])
+            updates.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            index.remove(ids)
+            deletes.append((time.perf_counter() - start) * 1000)
+        print(f"re-index batch of {args.batch_size}: {percentiles(updates)}")
+        print(f"delete batch of {args.batch_size}:   {percentiles(deletes)}")
+
+        start = time.perf_counter()
+        index.drop_file(f"file-{args.files - 1}")
+        print(f"drop file ({rows_per_file:,} chunks): {time.perf_counter() - start:.2f}s, {index.count():,} chunks left")
+
+
+if __name__ == "__main__":
+    main()
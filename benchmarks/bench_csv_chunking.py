@@ -0,0 +1,163 @@
+"""Ingest throughput and retrieval quality of the CSV chunking strategies.
+
+Throughput: chunking rows/sec for each strategy over generated ledgers of
+10k-1M rows, plus embedding chunks/sec measured on a sample and extrapolated.
+Quality: hit@k of row-targeted questions over a smaller generated corpus,
+compared with the old one-document-per-file ingestion.
+
+    python benchmarks/bench_csv_chunking.py --sizes 10000 100000 1000000
+    python benchmarks/bench_csv_chunking.py --skip-throughput --quality-rows 2000
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+from csv_chunking import CHUNK_STRATEGIES, chunk_csv, format_row
+
+HEADER = ["Month", "Account", "Department", "Vendor", "Expenses", "Budget", "Actuals", "Previous Month Expenses"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August",
+          "September", "October", "November", "December"]
+DEPARTMENTS = [
+    ("Research & Development", "R&D"),
+    ("Advertising & Marketing", "Marketing"),
+    ("Operations", "Operations"),
+    ("Sales", "Sales"),
+    ("Human Resources", "HR"),
+    ("Information Technology", "IT"),
+]
+
+
+def generate_rows(n_rows, seed=0):
+    rng = random.Random(seed)
+    for i in range(n_rows):
+        account, department = DEPARTMENTS[i % len(DEPARTMENTS)]
+        budget = rng.randrange(5000, 50000, 500)
+        yield [
+            MONTHS[(i // len(DEPARTMENTS)) % len(MONTHS)],
+            account,
+            department,
+            f"Vendor {i:07d}",
+            str(rng.randrange(5000, 50000, 100)),
+            str(budget),
+            str(budget + rng.randrange(-3000, 3000, 100)),
+            str(rng.randrange(5000, 50000, 100)),
+        ]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def bench_throughput(sizes, embed_sample, embeddings, workdir):
+    print("== ingest throughput ==")
+    for n_rows in sizes:
+        path = os.path.join(workdir, f"ledger_{n_rows}.csv")
+        write_csv(path, generate_rows(n_rows))
+        for strategy in CHUNK_STRATEGIES:
+            start = time.perf_counter()
+            chunks = chunk_csv(path, strategy=strategy)
+            chunk_seconds = time.perf_counter() - start
+
+            line = f"{n_rows:>9} rows  {strategy:<7} {len(chunks):>9} chunks  chunk {n_rows / chunk_seconds:>11,.0f} rows/s"
+            if embeddings is not None:
+                sample = [chunk.page_content for chunk in chunks[:embed_sample]]
+                start = time.perf_counter()
+                embeddings.embed_documents(sample)
+                chunks_per_sec = len(sample) / (time.perf_counter() - start)
+                line += f"  embed {chunks_per_sec:>7.1f} chunks/s (~{len(chunks) / chunks_per_sec / 60:.1f} min for all)"
+            print(line)
+            del chunks
+        os.remove(path)
+
+
+def hit_at_k(doc_vectors, query_vectors, is_hit, k):
+    scores = np.asarray(query_vectors) @ np.asarray(doc_vectors).T
+    top_k = np.argsort(-scores, axis=1)[:, :k]
+    return np.mean([any(is_hit(q, d) for d in row) for q, row in enumerate(top_k)])
+
+
+def bench_quality(n_rows, n_files, n_queries, k, embeddings, workdir):
+    print(f"== retrieval quality: {n_rows} rows in {n_files} files, {n_queries} questions, hit@{k} ==")
+    rows = list(generate_rows(n_rows, seed=1))
+    rows_per_file = n_rows // n_files
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(workdir, f"quality_{i}.csv")
+        write_csv(path, rows[i * rows_per_file:(i + 1) * rows_per_file])
+        paths.append(path)
+
+    rng = random.Random(2)
+    targets = rng.sample(range(n_files * rows_per_file), n_queries)
+    questions = [
+        f"What were the expenses for {rows[t][3]} in {rows[t][0]} for the {rows[t][2]} department?"
+        for t in targets
+    ]
+    query_vectors = embeddings.embed_documents(questions)
+
+    # Old ingestion: one document per file, all rows joined together
+    file_texts = []
+    for i in range(n_files):
+        file_rows = rows[i * rows_per_file:(i + 1) * rows_per_file]
+        file_texts.append("\n".join(format_row(HEADER, row) for row in file_rows))
+    score = hit_at_k(
+        embeddings.embed_documents(file_texts),
+        query_vectors,
+        lambda q, d: targets[q] // rows_per_file == d,
+        k,
+    )
+    print(f"  whole-file  {n_files:>7} docs   hit@{k} = {score:.3f}")
+
+    for strategy in CHUNK_STRATEGIES:
+        chunks = []
+        for i, path in enumerate(paths):
+            for chunk in chunk_csv(path, strategy=strategy):
+                # Row numbers are per file; shift them to global row indices
+                offset = i * rows_per_file
+                chunks.append((chunk, chunk.metadata["row_start"] - 1 + offset, chunk.metadata["row_end"] - 1 + offset))
+        doc_vectors = embeddings.embed_documents([chunk.page_content for chunk, _, _ in chunks])
+        score = hit_at_k(
+            doc_vectors,
+            query_vectors,
+            lambda q, d: chunks[d][1] <= targets[q] <= chunks[d][2],
+            k,
+        )
+        print(f"  {strategy:<10}  {len(chunks):>7} docs   hit@{k} = {score:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--embed-sample", type=int, default=256, help="chunks embedded per size to estimate embed throughput")
+    parser.add_argument("--no-embed", action="store_true", help="only measure chunking throughput")
+    parser.add_argument("--skip-throughput", action="store_true")
+    parser.add_argument("--quality-rows", type=int, default=2_000)
+    parser.add_argument("--quality-files", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    embeddings = None
+    if not args.no_embed:
+        embeddings = HuggingFaceEmbeddings(model_name="intfloat/e5-large-v2", encode_kwargs={"normalize_embeddings": True})
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.skip_throughput:
+            bench_throughput(args.sizes, args.embed_sample, embeddings, workdir)
+        if embeddings is not None:
+            bench_quality(args.quality_rows, args.quality_files, args.queries, args.k, embeddings, workdir)
+
+
+if __name__ == "__main__":
+    main()
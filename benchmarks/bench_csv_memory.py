@@ -0,0 +1,63 @@
+"""Peak Python heap (tracemalloc) of CSV loading vs. file size.
+
+Compares the old path (CSVLoader.load() materializing every row, then joining
+them into one string) with streaming the file through csv_chunking.iter_csv_chunks.
+The streaming peak should stay flat as the file grows.
+
+    python benchmarks/bench_csv_memory.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_community.document_loaders.csv_loader import CSVLoader
+
+from bench_csv_chunking import generate_rows, write_csv
+from csv_chunking import iter_csv_chunks
+
+
+def load_materialized(path):
+    documents = CSVLoader(file_path=path).load()
+    text = "\n".join(doc.page_content for doc in documents)
+    return len(text)
+
+
+def load_streaming(path):
+    total = 0
+    for chunk in iter_csv_chunks(path, strategy="tokens"):
+        total += len(chunk.page_content)
+    return total
+
+
+def peak_mib(fn, path):
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-materialized", action="store_true", help="only measure the streaming loader")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'file MiB':>9} {'materialized MiB':>17} {'streaming MiB':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in args.sizes:
+            path = os.path.join(workdir, f"ledger_{n_rows}.csv")
+            write_csv(path, generate_rows(n_rows))
+            file_mib = os.path.getsize(path) / 2**20
+            materialized = "-" if args.skip_materialized else f"{peak_mib(load_materialized, path):.1f}"
+            streaming = peak_mib(load_streaming, path)
+            print(f"{n_rows:>9} {file_mib:>9.1f} {materialized:>17} {streaming:>14.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Retrieval recall and estimated rewrite rate with raw vs. e5-prefixed embeddings.
+
+Builds a labelled question set from dummy_data_for_llm_testing.csv: several
+phrasings per row, each labelled with the row it is about. Every row is one
+chunk (the "row" strategy), embedded once without and once with the
+"query: "/"passage: " prefixes. Reports recall@k per scheme and the estimated
+rewrite rate, i.e. the share of questions whose row is missing from the top-k
+the retriever hands to grade_documents (k=4, the retriever default), which is
+what sends a turn into another rewrite cycle.
+
+    python benchmarks/bench_e5_prefixes.py -k 1 4 10
+"""
+import argparse
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from csv_chunking import chunk_csv
+from embedding_backends import load_embeddings, with_prefixes
+
+MODEL_NAME = "intfloat/e5-large-v2"
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "dummy_data_for_llm_testing.csv")
+RETRIEVER_K = 4
+
+TEMPLATES = [
+    "How much did we spend with {Vendor} in {Month}?",
+    "What was the {Department} budget for {Month}?",
+    "What were the actual {Account} costs in {Month}?",
+    "How do {Month} expenses for {Department} compare with the previous month?",
+    "Did {Department} stay within budget in {Month}?",
+]
+
+
+def labelled_questions(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [(template.format(**row), label) for label, row in enumerate(rows) for template in TEMPLATES]
+
+
+def ranks(embeddings, passages, questions):
+    doc_vectors = np.asarray(embeddings.embed_documents(passages), dtype=np.float32)
+    query_vectors = np.asarray([embeddings.embed_query(q) for q in questions], dtype=np.float32)
+    doc_vectors /= np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return np.argsort(-(query_vectors @ doc_vectors.T), axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", type=int, nargs="+", default=[1, 4, 10])
+    args = parser.parse_args()
+
+    passages = [chunk.page_content for chunk in chunk_csv(SAMPLE_CSV, strategy="row")]
+    questions, labels = zip(*labelled_questions(SAMPLE_CSV))
+    labels = np.asarray(labels)
+    print(f"{len(questions)} labelled questions over {len(passages)} row chunks")
+
+    model = load_embeddings(MODEL_NAME)
+    for scheme in ("raw", "prefixed"):
+        ranked = ranks(with_prefixes(model, MODEL_NAME, scheme), passages, questions)
+        # Position of the labelled row in each question's ranking
+        positions = np.argmax(ranked == labels[:, None], axis=1)
+        recalls = "  ".join(f"recall@{k} {np.mean(positions < k):.3f}" for k in args.k)
+        rewrite_rate = np.mean(positions >= RETRIEVER_K)
+        print(f"  {scheme:<8}  {recalls}  MRR {np.mean(1 / (positions + 1)):.3f}  "
+              f"est. rewrite rate {rewrite_rate:.3f}")
+
+
+if __name__ == "__main__":
+    main()
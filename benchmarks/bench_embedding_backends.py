@@ -0,0 +1,107 @@
+"""Latency, throughput and recall@k parity of the e5-large-v2 CPU embedding backends.
+
+Each backend from embedding_backends (torch, int8, onnx) embeds the chunks of the
+sample CSV and of a generated ledger. Reported per backend and corpus:
+load time, document throughput, single-query latency (p50/p95), recall@k parity
+(overlap of each query's top-k chunks with the torch backend's top-k) and hit@k
+of row-targeted questions.
+
+    python benchmarks/bench_embedding_backends.py --backends torch int8 onnx --rows 5000
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from bench_csv_chunking import generate_rows, write_csv
+from csv_chunking import chunk_csv
+from embedding_backends import EMBEDDING_BACKENDS, load_embeddings
+
+MODEL_NAME = "intfloat/e5-large-v2"
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "dummy_data_for_llm_testing.csv")
+
+
+def question_for(row):
+    month, _, department, vendor = row[:4]
+    return f"What were the expenses for {vendor} in {month} for the {department} department?"
+
+
+def load_corpus(path, n_queries, seed=0):
+    """Row chunks of `path` plus questions that each target one row (its chunk index)."""
+    chunks = chunk_csv(path, strategy="row")
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))[1:]
+    targets = random.Random(seed).sample(range(len(rows)), min(n_queries, len(rows)))
+    return [chunk.page_content for chunk in chunks], [question_for(rows[t]) for t in targets], targets
+
+
+def top_k(doc_vectors, query_vectors, k):
+    doc_vectors = np.asarray(doc_vectors, dtype=np.float32)
+    query_vectors = np.asarray(query_vectors, dtype=np.float32)
+    doc_vectors /= np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :k]
+
+
+def bench_backend(embeddings, texts, questions, latency_queries):
+    start = time.perf_counter()
+    doc_vectors = embeddings.embed_documents(texts)
+    docs_per_sec = len(texts) / (time.perf_counter() - start)
+
+    latencies = []
+    query_vectors = []
+    for i, question in enumerate(questions):
+        start = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(question))
+        if i < latency_queries:
+            latencies.append((time.perf_counter() - start) * 1000)
+    return doc_vectors, query_vectors, docs_per_sec, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--rows", type=int, default=2000, help="rows in the generated ledger")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--latency-queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        generated = os.path.join(workdir, "ledger.csv")
+        write_csv(generated, generate_rows(args.rows, seed=3))
+        corpora = {
+            "sample": load_corpus(SAMPLE_CSV, args.queries),
+            f"generated-{args.rows}": load_corpus(generated, args.queries),
+        }
+
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    baseline = {}
+    print(f"{'backend':<7} {'corpus':<16} {'load s':>7} {'docs/s':>8} {'q p50 ms':>9} {'q p95 ms':>9} "
+          f"{'parity@' + str(args.k):>9} {'hit@' + str(args.k):>7}")
+    for backend in backends:
+        start = time.perf_counter()
+        embeddings = load_embeddings(MODEL_NAME, backend)
+        load_seconds = time.perf_counter() - start
+        for name, (texts, questions, targets) in corpora.items():
+            doc_vectors, query_vectors, docs_per_sec, p50, p95 = bench_backend(
+                embeddings, texts, questions, args.latency_queries
+            )
+            neighbours = top_k(doc_vectors, query_vectors, args.k)
+            baseline.setdefault(name, neighbours)
+            parity = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(neighbours, baseline[name])])
+            hit = np.mean([target in row for target, row in zip(targets, neighbours)])
+            print(f"{backend:<7} {name:<16} {load_seconds:>7.1f} {docs_per_sec:>8.1f} {p50:>9.1f} {p95:>9.1f} "
+                  f"{parity:>9.3f} {hit:>7.3f}")
+        del embeddings
+
+
+if __name__ == "__main__":
+    main()
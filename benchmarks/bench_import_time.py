@@ -0,0 +1,95 @@
+"""Cold-start cost of `import main`, now vs. an earlier git revision.
+
+Each measurement imports main in a fresh interpreter under `python -X importtime`
+and reports the wall clock plus the heaviest imports. `--ref` exports that
+revision with `git archive` into a temporary directory and measures it the same
+way, e.g. the commit before the lazy application context:
+
+    python benchmarks/bench_import_time.py --ref HEAD~1 --repeat 3
+
+`--warm-up` additionally times main.warm_up(), i.e. what the first turn pays now.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# main.py copies this into os.environ at import and fails when it is unset
+ENV_DEFAULTS = {"LANGCHAIN_API_KEY": "unused", "LANGCHAIN_TRACING_V2": "false"}
+
+
+def parse_importtime(stderr):
+    """Return [(cumulative_us, module)] for the top-level imports in `-X importtime` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # Nested imports are indented further than the single space of a top-level one
+        if not module.startswith("  "):
+            imports.append((int(cumulative), module.strip()))
+    return imports
+
+
+def measure(cwd, code):
+    env = {**ENV_DEFAULTS, **os.environ}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import failed in {cwd}:\n{result.stderr[-2000:]}")
+    return wall, parse_importtime(result.stderr)
+
+
+def export_ref(ref, target):
+    archive = os.path.join(target, "tree.tar")
+    subprocess.run(["git", "archive", "--format=tar", "-o", archive, ref], cwd=ROOT, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    # Reuse the working tree's data so neither side re-seeds Chroma
+    for name in ("chroma_db", "embedding_cache.sqlite3", "prompt_cache", ".env"):
+        source = os.path.join(ROOT, name)
+        if os.path.exists(source) and not os.path.exists(os.path.join(target, name)):
+            os.symlink(source, os.path.join(target, name))
+    return target
+
+
+def report(label, cwd, code, repeat, top):
+    walls = []
+    imports = []
+    for _ in range(repeat):
+        wall, imports = measure(cwd, code)
+        walls.append(wall)
+    print(f"{label}: best {min(walls):.2f}s, mean {sum(walls) / len(walls):.2f}s wall over {repeat} run(s)")
+    for cumulative, module in sorted(imports, reverse=True)[:top]:
+        print(f"    {cumulative / 1e6:7.2f}s  {module}")
+    return min(walls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ref", help="git revision to compare against")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    parser.add_argument("--warm-up", action="store_true", help="also time main.warm_up() in the current tree")
+    args = parser.parse_args()
+
+    current = report("import main (current)", ROOT, "import main", args.repeat, args.top)
+    if args.ref:
+        with tempfile.TemporaryDirectory() as target:
+            before = report(f"import main ({args.ref})", export_ref(args.ref, target), "import main", args.repeat, args.top)
+        print(f"Speedup: {before / current:.1f}x ({before - current:.2f}s saved per cold start)")
+    if args.warm_up:
+        report("import main + warm_up()", ROOT, "import main; main.warm_up()", 1, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Rows/sec per stage of IngestPipeline for different worker counts and batch sizes.
+
+Generates a ledger CSV, ingests it into a throwaway Chroma collection once per
+configuration and prints the per-stage report, so the bottleneck stage is visible.
+
+    python benchmarks/bench_ingest_pipeline.py --rows 100000 --workers 0 2 4 8 --batch-size 64
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_chroma import Chroma
+
+from bench_csv_chunking import generate_rows, write_csv
+from ingest_pipeline import IngestPipeline
+
+
+def build_embeddings():
+    # Uncached model: the benchmark measures real embedding throughput
+    from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name="intfloat/e5-large-v2")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, os.cpu_count() or 4])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--strategy", default="tokens")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "ledger.csv")
+        write_csv(csv_path, generate_rows(args.rows))
+
+        for workers in args.workers:
+            persist_dir = os.path.join(workdir, f"chroma_{workers}")
+            vectorstore = Chroma(persist_directory=persist_dir, embedding_function=build_embeddings())
+            print(f"== workers={workers} batch_size={args.batch_size} ==")
+            pipeline = IngestPipeline(vectorstore, build_embeddings, batch_size=args.batch_size, workers=workers)
+            start = time.perf_counter()
+            pipeline.run({"ledger.csv": csv_path}, strategy=args.strategy)
+            print(f"wall: {time.perf_counter() - start:.1f}s\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Per-node overhead of grade_documents and agent with a fake LLM.
+
+Compares building the structured-output grader / tool-bound model inside the
+node on every call (the old behaviour) with reusing runnables built once. The
+fake model answers instantly, so the numbers are pure construction overhead.
+
+    python benchmarks/bench_node_overhead.py --iterations 2000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import PromptTemplate
+from langchain_core.tools import tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel, Field
+
+from prompt_registry import prompt_registry
+
+
+class FakeToolChatModel(BaseChatModel):
+    """Chat model that always answers with a single tool call, without any I/O."""
+
+    @property
+    def _llm_type(self):
+        return "fake-tool-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        name = tools[0]["function"]["name"] if tools else "none"
+        args = {"binary_score": "yes"} if name == "grade" else {"query": "budget"}
+        message = AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": str(uuid.uuid4())}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def Financial_data_csv(query: str) -> str:
+    """This is the financial data of user in a csv format."""
+    return query
+
+
+class grade(BaseModel):
+    """Binary score for relevance check."""
+
+    binary_score: str = Field(description="Relevance score 'yes' or 'no'")
+
+
+GRADE_INPUT = {"question": "What is my January R&D budget?", "context": "Month: January, Department: R&D"}
+MESSAGES = [HumanMessage(content="What is my January R&D budget?")]
+
+
+def grade_per_call(llm):
+    class grade(BaseModel):
+        """Binary score for relevance check."""
+
+        binary_score: str = Field(description="Relevance score 'yes' or 'no'")
+
+    prompt = PromptTemplate(
+        template=prompt_registry.get_prompt("grade-documents").template,
+        input_variables=["context", "question"],
+    )
+    return (prompt | llm.with_structured_output(grade)).invoke(GRADE_INPUT)
+
+
+def agent_per_call(llm, tools):
+    return llm.bind_tools(tools).invoke(MESSAGES)
+
+
+def bench(label, fn, iterations):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call_us = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<28} {per_call_us:10.1f} us/call")
+    return per_call_us
+
+
+def main(iterations):
+    llm = FakeToolChatModel()
+    tools = [Financial_data_csv]
+
+    grade_chain = prompt_registry.chain("grade-documents", llm.with_structured_output(grade), output_parser=None)
+    model_with_tools = llm.bind_tools(tools)
+
+    print("grade_documents")
+    before = bench("  per-call construction", lambda: grade_per_call(llm), iterations)
+    after = bench("  hoisted chain", lambda: grade_chain.invoke(GRADE_INPUT), iterations)
+    print(f"  overhead removed: {before - after:.1f} us/call")
+
+    print("agent")
+    before = bench("  bind_tools per turn", lambda: agent_per_call(llm, tools), iterations)
+    after = bench("  bound once", lambda: model_with_tools.invoke(MESSAGES), iterations)
+    print(f"  overhead removed: {before - after:.1f} us/call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.iterations)
@@ -0,0 +1,116 @@
+"""Calibrate the relevance prefilter thresholds on the sample data.
+
+Builds labelled (question, chunk) pairs from dummy_data_for_llm_testing.csv:
+several question templates per row, each chunk one row (the "row" strategy).
+A chunk is relevant to a question when its row has every value the question
+names (e.g. the same Department and Month), so other rows sharing those values
+count as relevant too. Only each question's top-k retrieved chunks are scored,
+which is what the prefilter sees in grade_documents.
+
+Reports the cosine distributions of relevant and irrelevant pairs, and for the
+given thresholds the share of irrelevant chunks accepted and relevant chunks
+rejected without the LLM grader, plus the share still escalated to it. Also
+suggests the widest thresholds that stay within --max-error.
+
+    python benchmarks/bench_relevance_prefilter.py --accept 0.86 --reject 0.74
+"""
+import argparse
+import csv
+import os
+import string
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+
+from csv_chunking import chunk_csv
+from embedding_backends import load_embeddings, with_prefixes
+from relevance_prefilter import RELEVANCE_ACCEPT_THRESHOLD, RELEVANCE_REJECT_THRESHOLD
+
+MODEL_NAME = "intfloat/e5-large-v2"
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "dummy_data_for_llm_testing.csv")
+
+TEMPLATES = [
+    "How much did we spend with {Vendor} in {Month}?",
+    "What was the {Department} budget for {Month}?",
+    "What were the actual {Account} costs in {Month}?",
+    "Did {Department} stay within budget in {Month}?",
+    "How did {Department} spending on {Account} compare with the previous month?",
+]
+
+
+def template_fields(template):
+    return [field for _, field, _, _ in string.Formatter().parse(template) if field]
+
+
+def labelled_pairs(rows, templates):
+    """[(question, {relevant row indices})] for every template that fits the CSV's columns."""
+    pairs = []
+    for template in templates:
+        fields = template_fields(template)
+        if not all(field in rows[0] for field in fields):
+            continue
+        for row in rows:
+            relevant = {i for i, other in enumerate(rows) if all(other[f] == row[f] for f in fields)}
+            pairs.append((template.format(**row), relevant))
+    return pairs
+
+
+def normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accept", type=float, default=RELEVANCE_ACCEPT_THRESHOLD)
+    parser.add_argument("--reject", type=float, default=RELEVANCE_REJECT_THRESHOLD)
+    parser.add_argument("-k", type=int, default=4, help="chunks retrieved per question (retriever default)")
+    parser.add_argument("--max-error", type=float, default=0.01,
+                        help="tolerated share of wrong decisions on each side for the suggested thresholds")
+    args = parser.parse_args()
+
+    with open(SAMPLE_CSV, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    passages = [chunk.page_content for chunk in chunk_csv(SAMPLE_CSV, strategy="row")]
+    pairs = labelled_pairs(rows, TEMPLATES)
+
+    embeddings = with_prefixes(load_embeddings(MODEL_NAME), MODEL_NAME)
+    doc_vectors = normalized(embeddings.embed_documents(passages))
+    query_vectors = normalized([embeddings.embed_query(question) for question, _ in pairs])
+    similarities = query_vectors @ doc_vectors.T
+
+    relevant_scores, irrelevant_scores = [], []
+    for (_, relevant), scores in zip(pairs, similarities):
+        for i in np.argsort(-scores)[:args.k]:
+            (relevant_scores if i in relevant else irrelevant_scores).append(scores[i])
+    relevant_scores = np.asarray(relevant_scores)
+    irrelevant_scores = np.asarray(irrelevant_scores)
+    print(f"{len(pairs)} questions over {len(passages)} row chunks, top {args.k}: "
+          f"{len(relevant_scores)} relevant and {len(irrelevant_scores)} irrelevant pairs")
+    for name, scores in (("relevant", relevant_scores), ("irrelevant", irrelevant_scores)):
+        if len(scores):
+            p5, p50, p95 = np.percentile(scores, [5, 50, 95])
+            print(f"  {name:<10} cosine  min {scores.min():.3f}  p5 {p5:.3f}  p50 {p50:.3f}  "
+                  f"p95 {p95:.3f}  max {scores.max():.3f}")
+
+    all_scores = np.concatenate([relevant_scores, irrelevant_scores])
+    false_accept = np.mean(irrelevant_scores >= args.accept) if len(irrelevant_scores) else 0.0
+    false_reject = np.mean(relevant_scores <= args.reject) if len(relevant_scores) else 0.0
+    escalated = np.mean((all_scores > args.reject) & (all_scores < args.accept))
+    print(f"accept >= {args.accept:.3f}, reject <= {args.reject:.3f}: irrelevant accepted {false_accept:.3f}  "
+          f"relevant rejected {false_reject:.3f}  escalated to the LLM grader {escalated:.3f}")
+
+    if len(relevant_scores) and len(irrelevant_scores):
+        accept = float(np.quantile(irrelevant_scores, 1 - args.max_error)) + 1e-3
+        reject = float(np.quantile(relevant_scores, args.max_error)) - 1e-3
+        if reject > accept:
+            reject = accept
+        escalated = np.mean((all_scores > reject) & (all_scores < accept))
+        print(f"suggested (max error {args.max_error}): RELEVANCE_ACCEPT_THRESHOLD={accept:.3f} "
+              f"RELEVANCE_REJECT_THRESHOLD={reject:.3f}, escalated {escalated:.3f}")
+
+
+if __name__ == "__main__":
+    main()
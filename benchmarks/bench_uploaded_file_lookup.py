@@ -0,0 +1,112 @@
+"""Database round trips of resolving uploaded-file paths for a push of N files.
+
+Replaces postgresSQL.db_connection with a counting fake, so it needs no
+database: it reports connection checkouts and queries executed by the old
+per-file fetch_uploaded_files() loop and by fetch_uploaded_files_by_name(),
+and exits non-zero if the batched lookup needs more than two round trips
+(index check + lookup) or returns different paths.
+
+    python benchmarks/bench_uploaded_file_lookup.py --files 50
+"""
+import argparse
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import postgresSQL
+
+
+class RoundTrips:
+    def __init__(self, rows):
+        self.rows = rows
+        self.connections = 0
+        self.queries = 0
+
+    @contextmanager
+    def connection(self):
+        self.connections += 1
+        yield FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, counter):
+        self.counter = counter
+
+    def cursor(self):
+        return FakeCursor(self.counter)
+
+    def commit(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, counter):
+        self.counter = counter
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.counter.queries += 1
+        if "= ANY(%s)" in query:
+            wanted = set(params[0])
+            self.result = [row for row in self.counter.rows if row["file_name"] in wanted]
+        elif query.lstrip().startswith("SELECT"):
+            self.result = list(self.counter.rows)
+        else:
+            self.result = []
+
+    def fetchall(self):
+        return self.result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def per_file_lookup(file_names):
+    """What push_files_to_chroma used to do inside its per-file loop."""
+    paths = {}
+    for file_name in file_names:
+        file_metadata = postgresSQL.fetch_uploaded_files()
+        paths[file_name] = next((f['file_path'] for f in file_metadata if f['file_name'] == file_name), None)
+    return paths
+
+
+def batched_lookup(file_names):
+    return {f['file_name']: f['file_path'] for f in postgresSQL.fetch_uploaded_files_by_name(file_names)}
+
+
+def measure(lookup, file_names, rows):
+    counter = RoundTrips(rows)
+    postgresSQL.db_connection = counter.connection
+    postgresSQL._uploaded_files_index_ready = False
+    paths = lookup(file_names)
+    return counter, paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50, help="files selected for the push")
+    parser.add_argument("--table-rows", type=int, default=1000, help="rows in uploaded_files")
+    args = parser.parse_args()
+
+    rows = [{"file_name": f"file_{i}.csv", "file_path": f"./uploaded_files/file_{i}.csv"} for i in range(args.table_rows)]
+    file_names = [row["file_name"] for row in rows[:args.files]]
+
+    old, old_paths = measure(per_file_lookup, file_names, rows)
+    new, new_paths = measure(batched_lookup, file_names, rows)
+
+    print(f"per-file loop : {old.connections:>4} checkouts  {old.queries:>4} queries")
+    print(f"batched lookup: {new.connections:>4} checkouts  {new.queries:>4} queries")
+
+    if new_paths != old_paths:
+        raise SystemExit("batched lookup returned different paths")
+    if new.connections > 2 or new.queries > 2:
+        raise SystemExit("batched lookup needs more than two round trips")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# bm25_index.py
+import math
+import os
+import re
+import sqlite3
+import threading
+
+BM25_INDEX_NAME = "bm25_index.sqlite3"
+# Query terms found in more than this share of chunks (column names like "vendor" or
+# "expenses" in every row) carry almost no BM25 weight but dominate query time; skip them
+BM25_MAX_DOC_FREQ = float(os.getenv("BM25_MAX_DOC_FREQ", "0.2"))
+# Terms in at most this share of chunks (vendor names, account codes) select the candidates;
+# commoner terms such as months then only re-rank those candidates instead of being scanned
+BM25_SELECTIVE_DOC_FREQ = float(os.getenv("BM25_SELECTIVE_DOC_FREQ", "0.01"))
+# Candidates fetched per requested result when re-ranking
+BM25_CANDIDATES_PER_RESULT = 5
+# The document frequency cutoffs above only apply from this many chunks on. In a small
+# corpus (the sample CSVs are 2-3 chunks with token chunking) every term is in a large
+# share of the chunks, and a plain OR query over all terms is cheap anyway.
+BM25_MIN_PRUNE_CHUNKS = int(os.getenv("BM25_MIN_PRUNE_CHUNKS", "10000"))
+
+# Question words that match most chunks and only slow BM25 queries down. Single letters
+# are kept: they are identifiers in the data (e.g. "Vendor A").
+STOPWORDS = frozenset(
+    "an and are as at be by did do does for from how in is it me my of on or our the to was we were what "
+    "when where which who why with you your".split()
+)
+
+
+def query_terms(text):
+    """Lower-cased word tokens of `text` without stopwords, deduplicated in order."""
+    return list(dict.fromkeys(token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS))
+
+
+def idf(doc_freq, total):
+    """BM25 inverse document frequency, as used by FTS5."""
+    return math.log((total - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+
+
+def _match_expression(terms, operator="OR"):
+    return f" {operator} ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class BM25Index:
+    """
+    Lexical inverted index over chunk text, ranked with BM25 (SQLite FTS5).
+
+    It lives next to the Chroma data like the file index and uses the same chunk
+    ids, so exact tokens such as vendor names, months and account codes can be
+    matched even when the dense retriever misses them. The ingestion pipeline
+    and vector deletes keep it in step incrementally; `rebuild` backfills it
+    once from an existing collection.
+    """
+
+    def __init__(self, persist_dir):
+        os.makedirs(persist_dir, exist_ok=True)
+        self.path = os.path.join(persist_dir, BM25_INDEX_NAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                file_name TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_file_name ON chunks (file_name);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5(
+                content, tokenize = 'unicode61 remove_diacritics 2'
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5vocab(chunk_text, 'row');
+            CREATE TABLE IF NOT EXISTS index_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        # Chunk count and per-term document frequencies, cached until the next write.
+        # Counting a term found in most chunks reads its whole posting list.
+        self._total = None
+        self._doc_freq = {}
+
+    def _invalidate(self):
+        self._total = None
+        self._doc_freq = {}
+
+    def _chunk_count(self):
+        # Called with self._lock held
+        if self._total is None:
+            (self._total,) = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return self._total
+
+    def _doc_freqs(self, terms):
+        # Called with self._lock held
+        missing = [term for term in terms if term not in self._doc_freq]
+        if missing:
+            placeholders = ",".join("?" * len(missing))
+            found = dict(self._conn.execute(
+                f"SELECT term, doc FROM chunk_terms WHERE term IN ({placeholders})", missing
+            ).fetchall())
+            for term in missing:
+                self._doc_freq[term] = found.get(term, 0)
+        return {term: self._doc_freq[term] for term in terms}
+
+    def _delete_rowids(self, rowids):
+        self._invalidate()
+        self._conn.executemany("DELETE FROM chunk_text WHERE rowid = ?", [(rowid,) for rowid in rowids])
+        self._conn.executemany("DELETE FROM chunks WHERE rowid = ?", [(rowid,) for rowid in rowids])
+
+    def _rowids(self, column, values):
+        rowids = []
+        for start in range(0, len(values), 500):
+            batch = values[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(f"SELECT rowid FROM chunks WHERE {column} IN ({placeholders})", batch).fetchall()
+            rowids.extend(row[0] for row in rows)
+        return rowids
+
+    def _add(self, rows):
+        # rows: (chunk_id, file_name, text); re-indexed chunks replace their old entry
+        rows = list({chunk_id: (chunk_id, file_name, text) for chunk_id, file_name, text in rows}.values())
+        self._delete_rowids(self._rowids("chunk_id", [chunk_id for chunk_id, _, _ in rows]))
+        for chunk_id, file_name, text in rows:
+            cursor = self._conn.execute("INSERT INTO chunks (chunk_id, file_name) VALUES (?, ?)", (chunk_id, file_name))
+            self._conn.execute("INSERT INTO chunk_text (rowid, content) VALUES (?, ?)", (cursor.lastrowid, text))
+
+    def add(self, file_name, chunk_ids, texts):
+        """Index (or re-index) chunks of `file_name`."""
+        with self._lock:
+            self._add([(chunk_id, file_name, text) for chunk_id, text in zip(chunk_ids, texts)])
+            self._conn.commit()
+
+    def remove(self, chunk_ids):
+        with self._lock:
+            self._delete_rowids(self._rowids("chunk_id", list(chunk_ids)))
+            self._conn.commit()
+
+    def drop_file(self, file_name):
+        with self._lock:
+            self._delete_rowids(self._rowids("file_name", [file_name]))
+            self._conn.commit()
+
+    def _ranked(self, match, limit):
+        # Called with self._lock held
+        return self._conn.execute(
+            """
+            SELECT chunks.chunk_id, bm25(chunk_text) AS rank, chunk_text.content
+            FROM chunk_text JOIN chunks ON chunks.rowid = chunk_text.rowid
+            WHERE chunk_text MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (match, limit),
+        ).fetchall()
+
+    def search(self, query, k=20):
+        """Return up to `k` (chunk_id, score) pairs, best first; higher scores are better."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            total = self._chunk_count()
+            if total < BM25_MIN_PRUNE_CHUNKS:
+                rows = self._ranked(_match_expression(terms), k)
+                return [(chunk_id, -rank) for chunk_id, rank, _ in rows]
+            doc_freq = self._doc_freqs(terms)
+            # Terms in no chunk cannot match, and very common ones cannot tell chunks apart;
+            # a query made only of those is left to the dense retriever
+            terms = [term for term in terms if 0 < doc_freq[term] <= BM25_MAX_DOC_FREQ * total]
+            if not terms:
+                return []
+            selective = [term for term in terms if doc_freq[term] <= BM25_SELECTIVE_DOC_FREQ * total]
+            rerank = [term for term in terms if term not in selective] if selective else []
+            if selective:
+                rows = self._ranked(_match_expression(selective), k * BM25_CANDIDATES_PER_RESULT if rerank else k)
+            else:
+                # Only common terms: chunks containing all of them first, which reads far fewer
+                # postings than OR-ing them, and OR only when that finds too few
+                rows = self._ranked(_match_expression(terms, "AND"), k) if len(terms) > 1 else []
+                if len(rows) < k:
+                    rows = self._ranked(_match_expression(terms), k)
+
+        # FTS5's bm25() is negative, lower meaning more relevant
+        scored = [(chunk_id, -rank) for chunk_id, rank, _ in rows]
+        if rerank:
+            # Add the weight of the commoner terms each candidate contains
+            weights = {term: idf(doc_freq[term], total) for term in rerank}
+            scored = [
+                (chunk_id, score + sum(weight for term, weight in weights.items() if term in tokens))
+                for (chunk_id, score), tokens in zip(scored, (set(re.findall(r"\w+", content.lower())) for _, _, content in rows))
+            ]
+            scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def count(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return count
+
+    def is_built(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM index_state WHERE key = 'built'").fetchone()
+        return row is not None
+
+    def rebuild(self, vectorstore, page_size=5000):
+        """One-off backfill from an existing collection, paging through its documents."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_text")
+            self._conn.execute("DELETE FROM chunks")
+            offset = 0
+            while True:
+                page = vectorstore.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+                if not page['ids']:
+                    break
+                self._add([
+                    (chunk_id, (metadata or {}).get('file_name', ''), text or '')
+                    for chunk_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+                ])
+                offset += len(page['ids'])
+            self._conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES ('built', '1')")
+            self._conn.commit()
@@ -1,44 +1,192 @@
 import os
+import threading
+from functools import partial
 # import chardet
 # import fitz  # PyMuPDF for PDF processing
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 # from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain.schema import Document
-from postgresSQL import fetch_uploaded_files
+from csv_chunking import iter_csv_chunks
+from ingest_pipeline import IngestPipeline
+from vector_file_index import VectorFileIndex
+from bm25_index import BM25Index
+from postgresSQL import fetch_uploaded_files_by_name
 # from postgresSQL import fetch_uploaded_file_content
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+from embedding_cache import CachedEmbeddings
+from embedding_backends import (
+    EMBEDDING_BACKEND,
+    SchemeEmbeddings,
+    backend_cache_name,
+    embedding_scheme,
+    load_embeddings,
+    with_prefixes,
+)
 model_name = "intfloat/e5-large-v2"
+# Configured "prefixed" (e5 "query: "/"passage: " instructions) or "raw" scheme; see embedding_backends.
+# An existing collection keeps its stored scheme until migrate_embeddings.py re-embeds it.
+EMBEDDING_SCHEME = embedding_scheme(model_name)
 
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+# from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 from dotenv import load_dotenv
 load_dotenv()
 
 # embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", api_key = os.getenv("GOOGLE_API_KEY"))
 
-hf_embeddings = HuggingFaceEmbeddings(
-    model_name=model_name,
-)
+_model = None
+_model_lock = threading.Lock()
 
-PERSIST_DIR = './chroma_db'
-vectorstore = None
 
-file_document_ids = {}  # Dictionary to track file names and their associated document IDs
+def load_hf_embeddings():
+    # torch and sentence-transformers are only imported when the model is first needed;
+    # EMBEDDING_BACKEND selects full-precision PyTorch, int8-quantized PyTorch or ONNX Runtime.
+    # One model instance serves every scheme.
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = load_embeddings(model_name, EMBEDDING_BACKEND)
+    return _model
+
+
+_scheme_embeddings = {}
+
+
+def embeddings_for_scheme(scheme):
+    """Disk-cached embeddings producing `scheme` vectors; the model is loaded on the first cache miss."""
+    if scheme not in _scheme_embeddings:
+        _scheme_embeddings[scheme] = CachedEmbeddings(
+            lambda: with_prefixes(load_hf_embeddings(), model_name, scheme),
+            model_name=backend_cache_name(model_name, scheme=scheme),
+        )
+    return _scheme_embeddings[scheme]
 
-def fetch_files_in_vector_db():
-    # Initialize connection to the vector database
-    vectorstore = Chroma(persist_directory=PERSIST_DIR, embedding_function = hf_embeddings)
 
-    # Retrieve only the metadata
-    vector_metadata = vectorstore.get(include=['metadatas'])
+def active_embedding_scheme():
+    """Scheme of the stored vectors, used for queries and pushes until reembed_collection records a new one."""
+    return get_file_index().get_state("embedding_scheme", EMBEDDING_SCHEME)
 
-    # Extract file names from the metadata
-    file_names = [metadata.get('file_name') for metadata in vector_metadata['metadatas'] if 'file_name' in metadata]
 
-    return file_names
+# Embeddings are cached on disk, so re-ingested chunks and repeated questions skip the model.
+# They follow the stored scheme, so a legacy collection is never queried or extended with
+# vectors of another scheme.
+hf_embeddings = SchemeEmbeddings(embeddings_for_scheme, active_embedding_scheme)
+
+PERSIST_DIR = './chroma_db'
+# Local CSV a new vector store is seeded with, so the chatbot has data before the first upload
+SAMPLE_DATA_FILE = "dummy_data_for_llm_testing.csv"
+vectorstore = None
+
+file_index = None
+bm25_index = None
+
+
+def get_file_index():
+    """Return the file -> chunk id index, backfilling it once from an existing collection."""
+    global file_index
+    if file_index is None:
+        file_index = VectorFileIndex(PERSIST_DIR)
+        if not file_index.is_built():
+            file_index.rebuild(get_vectorstore())
+        check_embedding_scheme(file_index)
+    return file_index
+
+
+def get_bm25_index():
+    """Return the BM25 index over chunk text, backfilling it once from an existing collection."""
+    global bm25_index
+    if bm25_index is None:
+        bm25_index = BM25Index(PERSIST_DIR)
+        if not bm25_index.is_built():
+            bm25_index.rebuild(get_vectorstore())
+    return bm25_index
+
+
+def needs_sample_data():
+    """True while the vector store has never held any data (checked on content, not on ./chroma_db existing)."""
+    index = get_file_index()
+    return not index.files() and index.get_state("sample_data_seeded") is None
+
+
+def seed_sample_data():
+    """Ingest the bundled sample CSV into a new vector store, once."""
+    if not needs_sample_data():
+        return False
+    # A local file, not an upload, so it bypasses the uploaded_files lookup
+    ingest_files({SAMPLE_DATA_FILE: SAMPLE_DATA_FILE})
+    get_file_index().set_state("sample_data_seeded", "1")
+    return True
+
+
+def check_embedding_scheme(index):
+    """Record the scheme of a new collection, and warn when stored vectors use a different one than configured."""
+    scheme = index.get_state("embedding_scheme")
+    if scheme is None:
+        # Collections created before the scheme was recorded were embedded without prefixes
+        scheme = "raw" if index.files() else EMBEDDING_SCHEME
+        index.set_state("embedding_scheme", scheme)
+    if scheme != EMBEDDING_SCHEME:
+        print(
+            f"Vector store was embedded with the '{scheme}' scheme, so queries and pushes keep using it "
+            f"instead of '{EMBEDDING_SCHEME}'; run `python migrate_embeddings.py` to re-embed it."
+        )
+    return scheme
+
+
+def reembed_collection(batch_size=256):
+    """
+    Re-embed every stored chunk with the current embeddings and record the scheme.
+
+    Pages through the collection and replaces only the vectors; ids, texts and
+    metadata stay as they are.
+
+    Returns:
+        int: Number of chunks re-embedded
+    """
+    index = get_file_index()
+    collection = get_vectorstore()._collection
+    # The configured scheme, not hf_embeddings, which follows the stored one until the switch below
+    target_embeddings = embeddings_for_scheme(EMBEDDING_SCHEME)
+    offset = 0
+    while True:
+        page = collection.get(include=['documents'], limit=batch_size, offset=offset)
+        if not page['ids']:
+            break
+        collection.update(ids=page['ids'], embeddings=target_embeddings.embed_documents(page['documents']))
+        offset += len(page['ids'])
+        print(f"Re-embedded {offset} chunks")
+    index.set_state("embedding_scheme", EMBEDDING_SCHEME)
+    # Cached retrievals and answers came from the old vectors
+    index.bump_corpus_version()
+    return offset
+
+
+def corpus_version():
+    """Generation counter of the vector store content, bumped by every push or delete that changes it."""
+    return get_file_index().corpus_version()
+
+
+def fetch_files_in_vector_db():
+    """
+    List the files stored in the vector database.
+
+    Returns:
+        list[dict]: One entry per file with its `file_name` and `chunk_count`
+    """
+    return get_file_index().files()
+
+def vector_db_file_paths():
+    """
+    Map each file in the vector database to its CSV on disk.
+
+    Uploaded files are resolved through uploaded_files; the seeded sample CSV is
+    stored under its path, so its name is used as the path.
+    """
+    file_names = [f['file_name'] for f in fetch_files_in_vector_db()]
+    uploaded_paths = {f['file_name']: f['file_path'] for f in fetch_uploaded_files_by_name(file_names)}
+    paths = {file_name: uploaded_paths.get(file_name, file_name) for file_name in file_names}
+    return {file_name: path for file_name, path in paths.items() if os.path.exists(path)}
 
 def initialize_chroma(splits=None):
+    from langchain_chroma import Chroma
+
     global vectorstore
     if splits:
         print("Initializing Chroma with new documents...")
@@ -51,61 +199,75 @@ def initialize_chroma(splits=None):
     return vectorstore
 
 
-from langchain_community.document_loaders.csv_loader import CSVLoader
 def extract_text_from_pdf(file_path):
-    loader = CSVLoader(file_path=file_path)
-    data = loader.load()
-    return data
+    """Lazily yield one Document per CSV row (CSVLoader-style text), without loading the whole file."""
+    return iter_csv_chunks(file_path, strategy="row")
 
 
-def push_files_to_chroma(file_names, directory='./uploaded_files/'):
-    global file_document_ids
-    documents = []
-    
-    if os.path.exists(PERSIST_DIR):
-        for file_name in file_names:
-            # Retrieve file metadata to get the path
-            file_metadata = fetch_uploaded_files()
-            file_path = next((f['file_path'] for f in file_metadata if f['file_name'] == file_name), None)
-
-            if not file_path or not os.path.exists(file_path):
-                print(f"File {file_name} not found in uploaded_files directory.")
-                continue  # Skip if the file doesn't exist
-
-            # Load the CSV content using CSVLoader
-            loader = CSVLoader(file_path=file_path)
-            extracted_documents = loader.load()
-
-            # Combine page contents into a single string if needed
-            text = "\n".join([doc.page_content for doc in extracted_documents])
-
-            # Create a new Document with combined text
-            document = Document(page_content=text, metadata={"file_name": file_name})
-            documents.append(document)
-    
-    else:
-        for file_name in file_names:
-            file_path = os.path.join(file_name)
-            print("file_name ", file_path)
-            print("file name " ,file_name.endswith(".csv"))
-            print("file path " ,file_path.endswith(".csv"))
-
-            if file_name.endswith(".csv"):
-                # Extract text from the CSV file
-                extracted_documents = extract_text_from_pdf(file_path)
-
-                # Combine the page content of each document into a single string
-                text = "\n".join([doc.page_content for doc in extracted_documents])
-            # Create a new Document with combined text
-            document = Document(page_content=text, metadata={"file_name": file_name})
-            documents.append(document)
-
-    # Initialize Chroma with new documents and store document IDs
-    vectorstore = initialize_chroma(splits=documents)
-    
-    # Store document IDs based on metadata (filename)
-    file_document_ids[file_name] = [doc.metadata.get('file_name') for doc in documents]
-    
+def get_vectorstore():
+    """Return the shared Chroma store, opening (and creating) the persisted collection if needed."""
+    global vectorstore
+    if vectorstore is None:
+        from langchain_chroma import Chroma
+
+        vectorstore = Chroma(persist_directory=PERSIST_DIR, embedding_function=hf_embeddings)
+    return vectorstore
+
+
+def get_embeddings(scheme=None):
+    """
+    Embeddings factory used by the ingestion pipeline (also inside its worker processes).
+
+    The pipeline passes the active scheme, resolved in the parent process, so workers
+    do not have to open the file index to find it.
+    """
+    return embeddings_for_scheme(scheme) if scheme else hf_embeddings
+
+
+def push_files_to_chroma(file_names, directory='./uploaded_files/', strategy=None, rows_per_chunk=None, token_budget=None, batch_size=None, workers=None):
+    """
+    Chunk the given CSV files and sync the chunks into Chroma.
+
+    Files are streamed through IngestPipeline (read+chunk -> batched embed ->
+    batched write). Re-pushing a file only embeds chunks whose content changed, and
+    removes chunks that vanished from it, so pushing an unchanged file costs no
+    embedding calls. Chunking is controlled by `strategy` ("row", "rows" or "tokens"),
+    `rows_per_chunk` and `token_budget`; unset values fall back to the CSV_CHUNK_*
+    settings in csv_chunking. `batch_size` and `workers` default to the INGEST_*
+    settings in ingest_pipeline.
+    """
+    # Retrieve the paths of all selected files in a single query
+    uploaded_paths = {f['file_name']: f['file_path'] for f in fetch_uploaded_files_by_name(file_names)}
+    file_paths = {}
+    for file_name in file_names:
+        file_path = uploaded_paths.get(file_name)
+
+        if not file_path or not os.path.exists(file_path):
+            print(f"File {file_name} not found in uploaded_files directory.")
+            continue  # Skip if the file doesn't exist
+        file_paths[file_name] = file_path
+
+    return ingest_files(
+        file_paths, strategy=strategy, rows_per_chunk=rows_per_chunk, token_budget=token_budget,
+        batch_size=batch_size, workers=workers,
+    )
+
+
+def ingest_files(file_paths, strategy=None, rows_per_chunk=None, token_budget=None, batch_size=None, workers=None):
+    """Run IngestPipeline over {file_name: path}; see `push_files_to_chroma` for the options."""
+    chunk_options = dict(strategy=strategy, rows_per_chunk=rows_per_chunk, token_budget=token_budget)
+    vectorstore = get_vectorstore()
+    pipeline_options = {key: value for key, value in dict(batch_size=batch_size, workers=workers).items() if value is not None}
+    index = get_file_index()
+    pipeline = IngestPipeline(
+        vectorstore, partial(get_embeddings, active_embedding_scheme()), file_index=index,
+        lexical_index=get_bm25_index(), **pipeline_options,
+    )
+    file_stats = pipeline.run(file_paths, **chunk_options)
+    if any(counts["added"] or counts["deleted"] or counts["relabelled"] for counts in file_stats.values()):
+        # Invalidates answers and retrievals cached for the previous content
+        index.bump_corpus_version()
+
     return vectorstore
 
 
@@ -134,35 +296,15 @@ def delete_uploaded_file(file_name, directory='./uploaded_files/'):
 
 
 def delete_vectors_from_chroma(file_name):
-    global file_document_ids
-    vectorstore = initialize_chroma()
-
-    if file_name in file_document_ids:
-        document_ids = file_document_ids[file_name]
-        vectorstore.delete(ids=document_ids)  # Delete the vectors associated with the file
-        del file_document_ids[file_name]
-        print(f"Deleted vectors for {file_name}")
+    """Delete every vector of `file_name` with a metadata filter and drop it from the file index."""
+    index = get_file_index()
+    chunk_count = len(index.chunk_ids(file_name))
+
+    if chunk_count:
+        get_vectorstore()._collection.delete(where={"file_name": file_name})
+        index.drop_file(file_name)
+        get_bm25_index().drop_file(file_name)
+        index.bump_corpus_version()
+        print(f"Deleted {chunk_count} vectors for {file_name}")
     else:
         print(f"No vectors found for {file_name}")
-
-
-def delete_vectors_from_chroma(file_name):
-    # Initialize connection to the vector database
-    vectorstore = Chroma(persist_directory=PERSIST_DIR, embedding_function=hf_embeddings)
-
-    # Retrieve only the metadata, including ids
-    vector_metadata = vectorstore.get(include=['metadatas'])
-
-    # Match the file name with metadata to get the corresponding ID
-    document_ids_to_delete = [
-        doc_id for doc_id, metadata in zip(vector_metadata['ids'], vector_metadata['metadatas'])
-        if metadata.get('file_name') == file_name
-    ]
-
-    # Check if we found document IDs for deletion
-    if document_ids_to_delete:
-        # Use document IDs to delete the specific documents
-        vectorstore.delete(ids=document_ids_to_delete)
-        print(f"Deleted vectors for {file_name}")
-    else:
-        print(f"No vectors found for {file_name}")
\ No newline at end of file
@@ -0,0 +1,150 @@
+# csv_chunking.py
+import csv
+import hashlib
+import io
+import math
+import os
+from langchain.schema import Document
+
+# Chunking strategies for CSV ingestion:
+#   "row"    - one chunk per CSV row
+#   "rows"   - a fixed number of rows per chunk
+#   "tokens" - pack rows until a token budget is reached, repeating the header in every chunk
+CHUNK_STRATEGY = os.getenv("CSV_CHUNK_STRATEGY", "tokens")
+ROWS_PER_CHUNK = int(os.getenv("CSV_ROWS_PER_CHUNK", "5"))
+# e5-large-v2 truncates at 512 tokens; keep headroom for special tokens and prefixes
+CHUNK_TOKEN_BUDGET = int(os.getenv("CSV_CHUNK_TOKENS", "400"))
+
+CHUNK_STRATEGIES = ("row", "rows", "tokens")
+
+
+def approx_token_count(text):
+    """Cheap, conservative token estimate (numeric CSV text tokenizes at roughly 3 chars/token)."""
+    return math.ceil(len(text) / 3)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def with_chunk_ids(chunks):
+    """
+    Yield (id, chunk) pairs with deterministic Chroma ids derived from file name and content hash.
+
+    Identical content inside one file gets an occurrence suffix, so ids stay unique
+    and unchanged chunks keep their id when rows are added or removed elsewhere.
+    """
+    seen = {}
+    for chunk in chunks:
+        key = (chunk.metadata["file_name"], chunk.metadata["content_hash"])
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        yield content_hash(f"{key[0]}\x00{key[1]}\x00{occurrence}"), chunk
+
+
+def format_row(header, row):
+    """Render a row the same way CSVLoader does: one `column: value` line per field."""
+    return "\n".join(f"{column}: {value}" for column, value in zip(header, row))
+
+
+def _csv_line(row):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(row)
+    return buffer.getvalue()
+
+
+def _make_chunk(text, file_name, row_start, row_end):
+    return Document(
+        page_content=text,
+        metadata={
+            "file_name": file_name,
+            "row_start": row_start,
+            "row_end": row_end,
+            "content_hash": content_hash(text),
+        },
+    )
+
+
+def _chunk_by_rows(header, rows, file_name, rows_per_chunk):
+    batch = []
+    row_start = 1
+    for row_number, row in enumerate(rows, start=1):
+        batch.append(format_row(header, row))
+        if len(batch) == rows_per_chunk:
+            yield _make_chunk("\n\n".join(batch), file_name, row_start, row_number)
+            batch = []
+            row_start = row_number + 1
+    if batch:
+        yield _make_chunk("\n\n".join(batch), file_name, row_start, row_start + len(batch) - 1)
+
+
+def _chunk_by_tokens(header, rows, file_name, token_budget, token_counter):
+    header_line = _csv_line(header)
+    header_tokens = token_counter(header_line)
+    lines = []
+    used = header_tokens
+    row_start = 1
+    for row_number, row in enumerate(rows, start=1):
+        line = _csv_line(row)
+        line_tokens = token_counter(line) + 1  # +1 for the newline
+        if lines and used + line_tokens > token_budget:
+            yield _make_chunk("\n".join([header_line] + lines), file_name, row_start, row_number - 1)
+            lines = []
+            used = header_tokens
+            row_start = row_number
+        lines.append(line)
+        used += line_tokens
+    if lines:
+        yield _make_chunk("\n".join([header_line] + lines), file_name, row_start, row_start + len(lines) - 1)
+
+
+def iter_csv_chunks(
+    file_path,
+    file_name=None,
+    strategy=None,
+    rows_per_chunk=None,
+    token_budget=None,
+    token_counter=approx_token_count,
+):
+    """
+    Lazily split a CSV file into Documents ready for embedding.
+
+    Args:
+        file_path (str): Path of the CSV file on disk
+        file_name (str): Name stored in the chunk metadata (defaults to the file's basename)
+        strategy (str): One of "row", "rows" or "tokens" (defaults to CSV_CHUNK_STRATEGY)
+        rows_per_chunk (int): Rows per chunk for the "rows" strategy
+        token_budget (int): Maximum tokens per chunk for the "tokens" strategy
+        token_counter (callable): Function returning the token count of a string
+
+    Yields:
+        Document: Chunks with file_name, row_start, row_end and content_hash metadata.
+        Row numbers are 1-based and exclude the header.
+    """
+    strategy = strategy or CHUNK_STRATEGY
+    if strategy not in CHUNK_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy {strategy!r}, expected one of {CHUNK_STRATEGIES}")
+    file_name = file_name or os.path.basename(file_path)
+
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        rows = (row for row in reader if row)
+
+        if strategy == "row":
+            yield from _chunk_by_rows(header, rows, file_name, 1)
+        elif strategy == "rows":
+            yield from _chunk_by_rows(header, rows, file_name, rows_per_chunk or ROWS_PER_CHUNK)
+        else:
+            yield from _chunk_by_tokens(header, rows, file_name, token_budget or CHUNK_TOKEN_BUDGET, token_counter)
+
+
+def chunk_csv(file_path, file_name=None, **options):
+    """Split a CSV file into a list of Documents; see `iter_csv_chunks` for the options."""
+    return list(iter_csv_chunks(file_path, file_name=file_name, **options))
+
+
+def chunk_row_count(chunk):
+    return chunk.metadata["row_end"] - chunk.metadata["row_start"] + 1
@@ -0,0 +1,114 @@
+# db_pool.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import extensions, pool
+
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+# Seconds to wait for a free connection before giving up
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))
+# Connections idle for longer than this are checked with SELECT 1 before use
+PG_POOL_CHECK_INTERVAL = float(os.getenv("PG_POOL_CHECK_INTERVAL", "30"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the timeout."""
+
+
+class PooledConnectionProvider:
+    """
+    Process-wide pool of psycopg2 connections with a context-manager API.
+
+    `connection()` blocks (up to `timeout`) while all `maxconn` connections are
+    checked out, health-checks connections that sat idle, and always returns the
+    connection to the pool in a clean transaction state. Checkout counts and wait
+    times are available from `metrics()`.
+    """
+
+    def __init__(self, dsn, minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX, timeout=PG_POOL_TIMEOUT,
+                 check_interval=PG_POOL_CHECK_INTERVAL, **connect_kwargs):
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, dsn, **connect_kwargs)
+        # ThreadedConnectionPool raises instead of waiting when exhausted; the semaphore makes callers wait
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0.0) < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if not self._healthy(conn):
+            self._pool.putconn(conn, close=True)
+            with self._lock:
+                self._metrics["discarded"] += 1
+            conn = self._pool.getconn()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._metrics["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["wait_seconds_total"] += waited
+            self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], waited)
+
+        try:
+            yield conn
+        finally:
+            # Hand the connection back outside any transaction; drop it if it broke
+            try:
+                if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                pass
+            if conn.closed:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        checkouts = metrics["checkouts"]
+        metrics["wait_seconds_avg"] = metrics["wait_seconds_total"] / checkouts if checkouts else 0.0
+        metrics["in_use"] = len(self._pool._used)
+        metrics["idle"] = len(self._pool._pool)
+        return metrics
+
+    def close(self):
+        self._pool.closeall()
@@ -0,0 +1,131 @@
+# embedding_backends.py
+import os
+import re
+from langchain_core.embeddings import Embeddings
+
+# "torch" (full-precision PyTorch, the original setup), "int8" (PyTorch with dynamically
+# int8-quantized Linear layers) or "onnx" (ONNX Runtime through sentence-transformers).
+# "onnx" is not covered by requirements.txt; it needs ONNX_REQUIREMENTS installed as well.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Optional ONNX file inside the model repo, e.g. a pre-quantized "onnx/model_qint8_avx512_vnni.onnx"
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+ONNX_REQUIREMENTS = '"sentence-transformers>=3.2" "optimum[onnxruntime]"'
+
+# Instruction prefixes (query, document) that models were trained with
+MODEL_PREFIXES = {
+    "intfloat/e5-large-v2": ("query: ", "passage: "),
+}
+# Apply MODEL_PREFIXES; changing this requires re-embedding the collection (migrate_embeddings.py)
+EMBEDDING_PREFIXES = os.getenv("EMBEDDING_PREFIXES", "true").lower() == "true"
+
+
+def embedding_scheme(model_name, prefixes=EMBEDDING_PREFIXES):
+    """How texts are turned into model input: "prefixed" or "raw". Stored vectors must match it."""
+    return "prefixed" if prefixes and model_name in MODEL_PREFIXES else "raw"
+
+
+def backend_cache_name(model_name, backend=EMBEDDING_BACKEND, scheme=None):
+    """
+    Name under which a backend's vectors are cached.
+
+    Quantized and ONNX vectors are close to, but not identical with, the PyTorch
+    ones, and prefixed inputs give different vectors for the same text, so each
+    combination gets its own embedding cache entries. The default backend with
+    raw inputs keeps the plain model name.
+    """
+    scheme = scheme or embedding_scheme(model_name)
+    name = model_name if backend == "torch" else f"{model_name}#{backend}"
+    return name if scheme == "raw" else f"{name}+{scheme}"
+
+
+class PrefixedEmbeddings(Embeddings):
+    """Prepends the model's instruction prefix to queries and documents before embedding."""
+
+    def __init__(self, embeddings, query_prefix, document_prefix):
+        self.embeddings = embeddings
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents([self.document_prefix + text for text in texts])
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(self.query_prefix + text)
+
+
+class SchemeEmbeddings(Embeddings):
+    """
+    Delegates to the embeddings of whichever scheme is active right now.
+
+    `for_scheme(scheme)` returns the embeddings for a scheme and `scheme()` the
+    active one, normally the scheme the stored vectors were built with. Queries
+    and pushes then keep matching the stored vectors until a re-embed switches
+    the stored scheme.
+    """
+
+    def __init__(self, for_scheme, scheme):
+        self.for_scheme = for_scheme
+        self.scheme = scheme
+
+    @property
+    def embeddings(self):
+        """The active scheme's embeddings (for CachedEmbeddings, loads the model)."""
+        return self.for_scheme(self.scheme()).embeddings
+
+    def embed_documents(self, texts):
+        return self.for_scheme(self.scheme()).embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.for_scheme(self.scheme()).embed_query(text)
+
+
+def with_prefixes(embeddings, model_name, scheme=None):
+    """Wrap `embeddings` in PrefixedEmbeddings when the scheme calls for it."""
+    if (scheme or embedding_scheme(model_name)) == "raw":
+        return embeddings
+    query_prefix, document_prefix = MODEL_PREFIXES[model_name]
+    return PrefixedEmbeddings(embeddings, query_prefix, document_prefix)
+
+
+def _sentence_transformer(embeddings):
+    # HuggingFaceEmbeddings keeps its SentenceTransformer in a private attribute
+    return getattr(embeddings, "_client", None) or getattr(embeddings, "client")
+
+
+def check_onnx_requirements():
+    """Raise ImportError naming the missing packages when the onnx backend cannot be loaded."""
+    from importlib.util import find_spec
+
+    import sentence_transformers
+
+    version = tuple(int(part) for part in re.findall(r"\d+", sentence_transformers.__version__)[:2])
+    if version < (3, 2) or find_spec("optimum") is None or find_spec("onnxruntime") is None:
+        raise ImportError(
+            f"EMBEDDING_BACKEND=onnx needs sentence-transformers>=3.2 (found {sentence_transformers.__version__}) "
+            f"and optimum[onnxruntime]; install them with: pip install {ONNX_REQUIREMENTS}"
+        )
+
+
+def load_embeddings(model_name, backend=EMBEDDING_BACKEND):
+    """Return HuggingFaceEmbeddings for `model_name` running on the given CPU backend."""
+    from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+    if backend == "onnx":
+        check_onnx_requirements()
+        model_kwargs = {"backend": "onnx"}
+        if EMBEDDING_ONNX_FILE:
+            model_kwargs["model_kwargs"] = {"file_name": EMBEDDING_ONNX_FILE}
+        return HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs)
+
+    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    if backend == "int8":
+        import torch
+
+        torch.quantization.quantize_dynamic(
+            _sentence_transformer(embeddings), {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return embeddings
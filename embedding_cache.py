@@ -0,0 +1,179 @@
+# embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# Share of max_entries evicted at once when the cache is full, so eviction runs rarely
+EMBEDDING_CACHE_EVICT_FRACTION = 0.05
+
+
+def normalize_text(text):
+    """Normalization applied before hashing so trivially different inputs share a cache entry."""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Disk-backed cache around another Embeddings implementation.
+
+    Vectors are stored in SQLite keyed by (model_name, kind, normalized text hash),
+    where kind is "document" or "query" because some models embed the two
+    differently. Re-ingested chunks and repeated questions skip the model. The
+    cache keeps at most `max_entries` vectors and evicts the least recently used.
+
+    `embeddings` may also be a zero-argument callable returning the wrapped
+    Embeddings; it is then called on the first cache miss, so constructing the
+    cache (and serving hits) never loads the model. The SQLite file is likewise
+    opened on first use.
+    """
+
+    def __init__(self, embeddings, model_name, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self._embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def embeddings(self):
+        """The wrapped Embeddings, loaded now if a factory was given."""
+        if not isinstance(self._embeddings, Embeddings) and callable(self._embeddings):
+            with self._model_lock:
+                if not isinstance(self._embeddings, Embeddings) and callable(self._embeddings):
+                    print(f"Loading embedding model {self.model_name}...")
+                    self._embeddings = self._embeddings()
+        return self._embeddings
+
+    def _connect(self):
+        # Called with self._lock held
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model_name, kind, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(MAX(last_used), 0), COUNT(*) FROM embeddings").fetchone()
+        # Running entry count, so storing a batch does not have to count the table
+        self._clock, self._count = row
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _lookup(self, kind, hashes):
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model_name = ? AND kind = ? AND text_hash IN ({placeholders})",
+                [self.model_name, kind, *batch],
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        if found:
+            now = self._tick()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model_name = ? AND kind = ? AND text_hash = ?",
+                [(now, self.model_name, kind, key) for key in found],
+            )
+        return found
+
+    def _store(self, kind, vectors_by_hash):
+        now = self._tick()
+        cursor = self._conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (model_name, kind, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(self.model_name, kind, key, array("f", vector).tobytes(), now) for key, vector in vectors_by_hash.items()],
+        )
+        self._count += cursor.rowcount
+        if cursor.rowcount < len(vectors_by_hash):
+            # Stored meanwhile by another thread or process; vectors are deterministic, only refresh the use time
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model_name = ? AND kind = ? AND text_hash = ?",
+                [(now, self.model_name, kind, key) for key in vectors_by_hash],
+            )
+        if self._count > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        # Other processes sharing the file also insert, so the running count is re-read here
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = self._count - self.max_entries
+        if excess > 0:
+            excess += int(self.max_entries * EMBEDDING_CACHE_EVICT_FRACTION)
+            cursor = self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self._count -= cursor.rowcount
+
+    def _embed(self, kind, texts, embed_fn):
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            self._connect()
+            cached = self._lookup(kind, hashes)
+            self._conn.commit()
+
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in hashes if key in missing)
+        self.misses += sum(1 for key in hashes if key in missing)
+
+        if missing:
+            computed = dict(zip(missing, embed_fn(list(missing.values()))))
+            with self._lock:
+                self._store(kind, computed)
+                self._conn.commit()
+            cached.update(computed)
+
+        return [cached[key] for key in hashes]
+
+    def embed_documents(self, texts):
+        return self._embed("document", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def stats(self):
+        """Hit/miss counters for this process plus the number of stored vectors."""
+        with self._lock:
+            self._connect()
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,61 @@
+# event_loop.py
+import asyncio
+import threading
+
+
+class BackgroundEventLoop:
+    """
+    An asyncio event loop running forever in a daemon thread.
+
+    Synchronous code (the Streamlit script thread) submits coroutines to it and
+    gets concurrent.futures.Future objects back. Because the loop outlives each
+    call, async connection pools and HTTP clients bound to it are reused across
+    reruns and across concurrent user sessions.
+    """
+
+    def __init__(self, name="app-event-loop"):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule `coro` on the loop and return a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run `coro` on the loop and block until it finishes."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen):
+        """Consume an async generator on the loop, yielding its items to the calling thread."""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+_app_loop = None
+_app_loop_lock = threading.Lock()
+
+
+def get_app_loop():
+    """Return the process-wide background loop, starting it on first use."""
+    global _app_loop
+    if _app_loop is None:
+        with _app_loop_lock:
+            if _app_loop is None:
+                _app_loop = BackgroundEventLoop()
+    return _app_loop
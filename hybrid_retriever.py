@@ -0,0 +1,54 @@
+# hybrid_retriever.py
+import os
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+# Candidates taken from each of the vector and BM25 rankings before fusion
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+# Reciprocal rank fusion constant; larger values flatten the advantage of top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """Fuse several best-first lists of ids into one, scoring each id by sum(1 / (rrf_k + rank))."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (Chroma) + lexical (BM25) retrieval fused with reciprocal rank fusion.
+
+    Both rankings are keyed by chunk id, so a chunk found by both gets the sum
+    of its two RRF scores. Texts and metadata of the winners are read from
+    Chroma in one call.
+    """
+
+    vectorstore: Any
+    bm25_index: Any
+    k: int = 4
+    fetch_k: int = HYBRID_FETCH_K
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        collection = self.vectorstore._collection
+        query_embedding = self.vectorstore.embeddings.embed_query(query)
+        dense = collection.query(query_embeddings=[query_embedding], n_results=self.fetch_k, include=[])["ids"][0]
+        lexical = [chunk_id for chunk_id, _ in self.bm25_index.search(query, self.fetch_k)]
+
+        ids = reciprocal_rank_fusion([dense, lexical], self.rrf_k)[:self.k]
+        if not ids:
+            return []
+        found = collection.get(ids=ids, include=['documents', 'metadatas'])
+        by_id = {
+            doc_id: Document(page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(found['ids'], found['documents'], found['metadatas'])
+        }
+        # Ids still in the BM25 index but already deleted from Chroma are skipped
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
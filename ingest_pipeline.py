@@ -0,0 +1,313 @@
+# ingest_pipeline.py
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from csv_chunking import chunk_row_count, iter_csv_chunks, with_chunk_ids
+
+# Chunks per embedding batch / Chroma write
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+# Embedding worker processes; 0 embeds in a thread of the current process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+# Batches buffered between two stages before the upstream stage blocks
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+_DONE = object()
+
+# Embeddings used inside a worker process, created once by `_init_worker`
+_worker_embeddings = None
+
+
+def _init_worker(embeddings_factory):
+    global _worker_embeddings
+    _worker_embeddings = embeddings_factory()
+
+
+def _embed_in_worker(texts):
+    start = time.perf_counter()
+    vectors = _worker_embeddings.embed_documents(texts)
+    return vectors, time.perf_counter() - start
+
+
+class StageStats:
+    """Rows and busy time of one pipeline stage."""
+
+    def __init__(self, name, concurrency=1):
+        self.name = name
+        self.concurrency = concurrency
+        self.rows = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+
+    def record(self, rows, chunks, seconds):
+        self.rows += rows
+        self.chunks += chunks
+        self.busy_seconds += seconds
+
+    @property
+    def rows_per_sec(self):
+        """Rows/sec the stage sustains while busy, across all of its workers."""
+        if not self.busy_seconds:
+            return 0.0
+        return self.rows / (self.busy_seconds / self.concurrency)
+
+    def __repr__(self):
+        return (
+            f"{self.name:<7} rows={self.rows:>10}  chunks={self.chunks:>8}  "
+            f"busy={self.busy_seconds:8.2f}s  {self.rows_per_sec:>12,.0f} rows/s"
+        )
+
+
+class IngestPipeline:
+    """
+    Streaming CSV ingestion: read+chunk -> batched embed -> batched Chroma write.
+
+    Each stage runs concurrently and hands batches to the next one through a
+    bounded queue, so memory stays flat and the slowest stage sets the pace.
+    Embedding can fan out over a process pool (`workers` > 0). Chunks whose
+    content-hash id is already stored are not re-embedded, and chunks that
+    vanished from a file are deleted, exactly like a full re-push would leave it.
+    When a VectorFileIndex is given, a file's stored chunks are looked up through
+    it and it is kept in step with every write; a BM25Index given as
+    `lexical_index` is updated with the same adds and deletes.
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        embeddings_factory,
+        file_index=None,
+        lexical_index=None,
+        batch_size=INGEST_BATCH_SIZE,
+        workers=INGEST_WORKERS,
+        queue_size=INGEST_QUEUE_SIZE,
+    ):
+        self.vectorstore = vectorstore
+        self.embeddings_factory = embeddings_factory
+        self.file_index = file_index
+        self.lexical_index = lexical_index
+        self.batch_size = batch_size
+        self.workers = workers
+        self.embed_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "chunk": StageStats("chunk"),
+            "embed": StageStats("embed", concurrency=max(workers, 1)),
+            "write": StageStats("write"),
+        }
+        self.file_stats = {}
+        self.wall_seconds = 0.0
+        self._stop = threading.Event()
+        self._errors = []
+
+    # -- plumbing -------------------------------------------------------------
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        # The stop flag is only set before the writer finishes when a stage failed
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run_stage(self, target, *args):
+        try:
+            target(*args)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    # -- stages ---------------------------------------------------------------
+
+    def _existing_chunks(self, file_name):
+        if self.file_index is None:
+            return self.vectorstore.get(where={"file_name": file_name}, include=['metadatas'])
+        chunk_ids = self.file_index.chunk_ids(file_name)
+        if not chunk_ids:
+            return {'ids': [], 'metadatas': []}
+        return self.vectorstore.get(ids=chunk_ids, include=['metadatas'])
+
+    def _chunk_stage(self, files, chunk_options):
+        stats = self.stats["chunk"]
+        for file_name, file_path in files.items():
+            existing = self._existing_chunks(file_name)
+            existing_metadata = dict(zip(existing['ids'], existing['metadatas']))
+            file_stats = self.file_stats[file_name] = {"added": 0, "deleted": 0, "relabelled": 0, "unchanged": 0}
+            seen = set()
+            batch, relabel = [], []
+
+            started = time.perf_counter()
+            for chunk_id, chunk in with_chunk_ids(iter_csv_chunks(file_path, file_name=file_name, **chunk_options)):
+                seen.add(chunk_id)
+                if chunk_id not in existing_metadata:
+                    batch.append((chunk_id, chunk))
+                    file_stats["added"] += 1
+                elif existing_metadata[chunk_id] != chunk.metadata:
+                    relabel.append((chunk_id, chunk))
+                    file_stats["relabelled"] += 1
+                else:
+                    file_stats["unchanged"] += 1
+                stats.record(chunk_row_count(chunk), 1, 0.0)
+
+                if len(batch) == self.batch_size or len(relabel) == self.batch_size:
+                    stats.record(0, 0, time.perf_counter() - started)
+                    if batch and not self._put(self.embed_queue, ("add", batch)):
+                        return
+                    if relabel and not self._put(self.embed_queue, ("update", relabel)):
+                        return
+                    batch, relabel = [], []
+                    started = time.perf_counter()
+            stats.record(0, 0, time.perf_counter() - started)
+
+            vanished = [doc_id for doc_id in existing_metadata if doc_id not in seen]
+            file_stats["deleted"] = len(vanished)
+            pending = [("add", batch), ("update", relabel)]
+            if vanished:
+                pending.append(("delete", (file_name, vanished)))
+            for kind, payload in pending:
+                if payload and not self._put(self.embed_queue, (kind, payload)):
+                    return
+        self._put(self.embed_queue, _DONE)
+
+    def _embed_stage(self):
+        stats = self.stats["embed"]
+        if self.workers > 0:
+            # spawn, not fork: this process already runs the other pipeline threads
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.embeddings_factory,),
+            )
+            embeddings = None
+        else:
+            pool = None
+            embeddings = self.embeddings_factory()
+
+        # Batches being embedded, in submission order, so writes keep input order
+        in_flight = deque()
+
+        def drain(limit):
+            while len(in_flight) > limit:
+                batch, future = in_flight.popleft()
+                vectors, seconds = future.result()
+                stats.record(sum(chunk_row_count(chunk) for _, chunk in batch), len(batch), seconds)
+                if not self._put(self.write_queue, ("add", batch, vectors)):
+                    return False
+            return True
+
+        try:
+            while True:
+                item = self._get(self.embed_queue)
+                if item is _DONE:
+                    break
+                kind, payload = item
+                if kind != "add":
+                    # Deletes and metadata updates need no embeddings
+                    if not drain(0) or not self._put(self.write_queue, (kind, payload, None)):
+                        return
+                    continue
+
+                texts = [chunk.page_content for _, chunk in payload]
+                if pool is None:
+                    start = time.perf_counter()
+                    vectors = embeddings.embed_documents(texts)
+                    stats.record(sum(chunk_row_count(chunk) for _, chunk in payload), len(payload), time.perf_counter() - start)
+                    if not self._put(self.write_queue, ("add", payload, vectors)):
+                        return
+                else:
+                    in_flight.append((payload, pool.submit(_embed_in_worker, texts)))
+                    if not drain(self.workers * 2):
+                        return
+            if drain(0):
+                self._put(self.write_queue, _DONE)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _write_stage(self):
+        stats = self.stats["write"]
+        collection = self.vectorstore._collection
+        while True:
+            item = self._get(self.write_queue)
+            if item is _DONE:
+                return
+            kind, payload, vectors = item
+            start = time.perf_counter()
+            if kind == "delete":
+                file_name, ids = payload
+                collection.delete(ids=ids)
+                if self.file_index is not None:
+                    self.file_index.remove(file_name, ids)
+                if self.lexical_index is not None:
+                    self.lexical_index.remove(ids)
+                stats.record(0, len(ids), time.perf_counter() - start)
+                continue
+
+            ids = [chunk_id for chunk_id, _ in payload]
+            metadatas = [chunk.metadata for _, chunk in payload]
+            if kind == "add":
+                documents = [chunk.page_content for _, chunk in payload]
+                collection.upsert(
+                    ids=ids,
+                    embeddings=vectors,
+                    documents=documents,
+                    metadatas=metadatas,
+                )
+                # A batch never spans files: batches are flushed at the end of each file
+                if self.file_index is not None:
+                    self.file_index.add(metadatas[0]["file_name"], ids)
+                if self.lexical_index is not None:
+                    self.lexical_index.add(metadatas[0]["file_name"], ids, documents)
+            else:
+                collection.update(ids=ids, metadatas=metadatas)
+            stats.record(sum(chunk_row_count(chunk) for _, chunk in payload), len(payload), time.perf_counter() - start)
+
+    # -- entry point ----------------------------------------------------------
+
+    def run(self, files, **chunk_options):
+        """
+        Ingest `files` (a dict of file_name -> file_path) into the vector store.
+
+        Returns:
+            dict: Per-file counts of added, deleted, relabelled and unchanged chunks
+        """
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._run_stage, args=(self._chunk_stage, files, chunk_options), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._embed_stage,), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        # Chroma writes happen on the calling thread
+        self._run_stage(self._write_stage)
+        self._stop.set()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+        self.wall_seconds = time.perf_counter() - started
+        self.report()
+        return self.file_stats
+
+    def report(self):
+        total_rows = self.stats["chunk"].rows
+        print(f"Ingested {total_rows} rows in {self.wall_seconds:.2f}s ({total_rows / max(self.wall_seconds, 1e-9):,.0f} rows/s)")
+        for stage in self.stats.values():
+            print(f"  {stage!r}")
+        for file_name, counts in self.file_stats.items():
+            print(f"  {file_name}: {counts}")
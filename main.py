@@ -1,9 +1,10 @@
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.graph import StateGraph
 from chroma_db_init import initialize_chroma  # Import from combined Chroma and file manager
-from langchain_google_genai import ChatGoogleGenerativeAI
 from session_manager import generate_new_session_id  # For generating new session IDs
 
 # Load environment variables
@@ -13,37 +14,174 @@ os.environ["LANGCHAIN_API_KEY"] = os.getenv("LANGCHAIN_API_KEY")
 DB_URI = os.getenv("Postgres_sql_URL")
 
 # Define your RAG workflow, state management, etc.
-llm = ChatGoogleGenerativeAI(
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    model="gemini-1.5-pro",
-    temperature=0,
-    max_tokens=None,
+from chroma_db_init import (
+    initialize_chroma,
+    seed_sample_data,
+    hf_embeddings,
+    corpus_version,
+    vector_db_file_paths,
+    get_bm25_index,
 )
+from hybrid_retriever import HYBRID_RETRIEVAL, HybridRetriever
+from retriever_cache import CachedRetriever, shared_retriever_cache
+from table_store import TableQuery, TableStore
 
-from chroma_db_init import initialize_chroma, push_files_to_chroma
-from langchain.tools.retriever import create_retriever_tool
+# Separator between retrieved chunks in the retriever tool output. It never occurs inside a
+# CSV chunk, so grade_documents can split the output back into individual chunks.
+CHUNK_SEPARATOR = "\n\n-----\n\n"
+# Tool answering filter/group/aggregate questions exactly from the CSV files
+TABLE_QUERY_TOOL = "Financial_data_query"
+TABLE_QUERY_ERROR = "Error: "
 
-PERSIST_DIR = './chroma_db'
+# Columnar copies of the CSV files in the vector database; results are cached per file version
+table_store = TableStore(vector_db_file_paths)
 
-if os.path.exists(PERSIST_DIR):
-    pass
-else:
-    push_files_to_chroma(file_names = ["dummy_data_for_llm_testing.csv"])
 
-def initialize_retriever_tool():
+def build_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        model="gemini-1.5-pro",
+        temperature=0,
+        max_tokens=None,
+    )
+
+
+def build_retriever_tool():
+    from langchain.tools.retriever import create_retriever_tool
+
+    seed_sample_data()
+
     print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
-    retriever = initialize_chroma().as_retriever()
+    vectorstore = initialize_chroma()
+    if HYBRID_RETRIEVAL:
+        # Dense + BM25 results fused by reciprocal rank, so exact vendor/month/account tokens are matched
+        base_retriever = HybridRetriever(vectorstore=vectorstore, bm25_index=get_bm25_index())
+    else:
+        base_retriever = vectorstore.as_retriever()
+    # Repeated queries (rewrite loops, other users) within one corpus version skip Chroma
+    retriever = CachedRetriever(
+        retriever=base_retriever,
+        version=corpus_version,
+        cache=shared_retriever_cache,
+    )
 
     retriever_tool = create_retriever_tool(
         retriever,
         "Financial_data_csv",
         "This is the financial data of user in a csv format. If user want to know something about its financial data then search it and provide details to user.",
+        document_separator=CHUNK_SEPARATOR,
+    )
+    return retriever_tool
+
+
+def query_financial_data(**query):
+    """Run a TableQuery against table_store and return the result as JSON (or an error for the agent)."""
+    try:
+        result = table_store.query(TableQuery(**query))
+    except ValueError as e:
+        return f"{TABLE_QUERY_ERROR}{e}"
+    return json.dumps(result)
+
+
+def build_query_tool():
+    from langchain_core.tools import StructuredTool
+
+    try:
+        files = "; ".join(f"{name}: {', '.join(columns)}" for name, columns in table_store.schema().items())
+    except Exception as e:
+        print(f"Could not read the CSV schemas for {TABLE_QUERY_TOOL}: {e}")
+        files = ""
+
+    return StructuredTool.from_function(
+        func=query_financial_data,
+        name=TABLE_QUERY_TOOL,
+        description=(
+            "Exact filter, group-by and aggregate queries over the user's financial csv data. Use it for totals, "
+            "averages, counts, minimum/maximum and comparisons, e.g. total marketing spend in Q1 (filter Month 'in' "
+            "January, February, March) or which department is over budget (filter Actuals > other_column Budget). "
+            "Use Financial_data_csv instead to look up descriptive details."
+            + (f" Files and columns: {files}" if files else "")
+        ),
+        args_schema=TableQuery,
     )
 
-    global tools
-    tools = [retriever_tool]
 
-initialize_retriever_tool()
+def build_tools():
+    return [build_retriever_tool(), build_query_tool()]
+
+
+class AppContext:
+    """
+    Process-wide dependencies of the workflow, each built on first use.
+
+    Importing this module no longer loads the embedding model, opens Chroma,
+    seeds the sample CSV or creates the Gemini client; the first turn (or an
+    explicit `warm_up()`) does. Builds are guarded by a lock, so concurrent
+    sessions share one instance of each.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._values = {}
+
+    def _get(self, name, build):
+        if name not in self._values:
+            with self._lock:
+                if name not in self._values:
+                    self._values[name] = build()
+        return self._values[name]
+
+    def reset(self, *names):
+        """Drop the named values so they are rebuilt on next use."""
+        with self._lock:
+            for name in names:
+                self._values.pop(name, None)
+
+    @property
+    def llm(self):
+        return self._get("llm", build_llm)
+
+    @property
+    def tools(self):
+        return self._get("tools", build_tools)
+
+    @property
+    def model_with_tools(self):
+        # Bind the tool schemas once per tool set instead of on every agent turn
+        return self._get("model_with_tools", lambda: self.llm.bind_tools(self.tools))
+
+    @property
+    def tool_node(self):
+        return self._get("tool_node", lambda: ToolNode(self.tools))
+
+    @property
+    def grade_chain(self):
+        # Grader chain: prompt | LLM with structured output
+        return self._get(
+            "grade_chain",
+            lambda: prompt_registry.chain("grade-documents", self.llm.with_structured_output(grade), output_parser=None),
+        )
+
+
+app_context = AppContext()
+
+
+def initialize_retriever_tool():
+    """(Re)build the retriever tool and everything bound to it."""
+    app_context.reset("tools", "model_with_tools", "tool_node")
+    return app_context.tools
+
+
+def warm_up():
+    """Build every lazy dependency and load the embedding model ahead of the first turn."""
+    started = time.perf_counter()
+    app_context.model_with_tools
+    app_context.tool_node
+    app_context.grade_chain
+    hf_embeddings.embeddings
+    print(f"Workflow warmed up in {time.perf_counter() - started:.2f}s")
 
 from typing import Annotated, Sequence
 from typing_extensions import TypedDict
@@ -57,15 +195,67 @@ class AgentState(TypedDict):
     # The add_messages function defines how an update should be processed
     # Default is to replace. add_messages says "append"
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    # Per-turn budget counters and timings, reset at the start of every turn (see new_turn_state)
+    rewrites: int
+    retrievals: int
+    llm_calls: int
+    node_ms: dict
+    grader_calls: int
+    # Set by grade_documents: whether the last retrieval was relevant, the chunks passed on
+    # to generate, and whether the budget forced a best-effort answer instead of a rewrite
+    relevant: bool
+    context_chunks: list
+    budget_exhausted: bool
+
+
+# Per-turn retrieval budget. Once it runs out, the graph answers from the best context it has.
+MAX_REWRITES = int(os.getenv("MAX_REWRITES_PER_TURN", "2"))
+MAX_RETRIEVALS = int(os.getenv("MAX_RETRIEVALS_PER_TURN", "3"))
+# Counts sequential LLM round trips; one concurrent grading batch counts as a single call
+MAX_LLM_CALLS = int(os.getenv("MAX_LLM_CALLS_PER_TURN", "10"))
+# Maximum number of chunks graded at the same time
+GRADE_CONCURRENCY = int(os.getenv("GRADE_CONCURRENCY", "4"))
+
+
+def new_turn_state():
+    """State merged into every turn's input so counters start from zero."""
+    return {
+        "rewrites": 0,
+        "retrievals": 0,
+        "llm_calls": 0,
+        "grader_calls": 0,
+        "node_ms": {},
+        "relevant": False,
+        "budget_exhausted": False,
+    }
+
+
+def can_rewrite(state):
+    """Whether another rewrite -> agent -> retrieve -> grade cycle (plus the final generate) fits the budget."""
+    return (
+        state.get("rewrites", 0) < MAX_REWRITES
+        and state.get("retrievals", 0) < MAX_RETRIEVALS
+        # rewrite + agent + grade + generate
+        and state.get("llm_calls", 0) + 4 <= MAX_LLM_CALLS
+    )
+
+
+def node_stats(state, node, started, **counters):
+    """State update adding this node's elapsed time to node_ms, plus any counter updates."""
+    node_ms = dict(state.get("node_ms") or {})
+    node_ms[node] = round(node_ms.get(node, 0) + (time.perf_counter() - started) * 1000, 1)
+    return {"node_ms": node_ms, **counters}
 
 
 from typing import Annotated, Literal, Sequence
 from typing_extensions import TypedDict
 
-from langchain import hub
-from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import PromptTemplate
+from langchain_core.messages import BaseMessage, ToolMessage
+from prompt_registry import prompt_registry
+
+# Prompts load from the local cache or vendored copies; the hub is only an opt-in refresh.
+if os.getenv("PROMPT_HUB_REFRESH", "false").lower() == "true":
+    prompt_registry.refresh_all()
 
 from pydantic import BaseModel, Field
 
@@ -73,59 +263,110 @@ from pydantic import BaseModel, Field
 from langgraph.prebuilt import tools_condition
 
 
-def grade_documents(state) -> Literal["generate", "rewrite"]:
+# Data model
+class grade(BaseModel):
+    """Binary score for relevance check."""
+
+    binary_score: str = Field(description="Relevance score 'yes' or 'no'")
+
+
+from relevance_prefilter import RelevancePrefilter
+
+# Embedding-similarity scoring that settles clear cases before the LLM grader
+relevance_prefilter = RelevancePrefilter(hf_embeddings)
+
+
+def split_chunks(tool_output):
+    """Split the retriever tool output back into the individual retrieved chunks."""
+    return [chunk for chunk in tool_output.split(CHUNK_SEPARATOR) if chunk.strip()]
+
+
+def last_tool_messages(messages):
+    """The tool results appended after the last agent message (one per tool call)."""
+    tool_messages = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        tool_messages.append(message)
+    return tool_messages[::-1]
+
+
+def grade_documents(state):
     """
-    Determines whether the retrieved documents are relevant to the question.
+    Grades each retrieved chunk for relevance to the question, concurrently.
+    Exact results from the table query tool are kept without grading.
 
     Args:
         state (messages): The current state
 
     Returns:
-        str: A decision for whether the documents are relevant or not
+        dict: The relevant chunks, whether any were found, whether the budget is exhausted,
+            and updated counters
     """
 
     print("---CHECK RELEVANCE---")
-
-    # Data model
-    class grade(BaseModel):
-        """Binary score for relevance check."""
-
-        binary_score: str = Field(description="Relevance score 'yes' or 'no'")
-
-    # LLM with tool and validation
-    llm_with_tool = llm.with_structured_output(grade)
-
-    # Prompt
-    prompt = PromptTemplate(
-        template="""You are a grader assessing relevance of a retrieved document to a user question. \n 
-        Here is the retrieved document: \n\n {context} \n\n
-        Here is the user question: {question} \n
-        If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
-        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
-        input_variables=["context", "question"],
-    )
-
-    # Chain
-    chain = prompt | llm_with_tool
+    started = time.perf_counter()
 
     messages = state["messages"]
-    last_message = messages[-1]
+    tool_messages = last_tool_messages(messages)
 
     question = messages[0].content
-    docs = last_message.content
-
-    scored_result = chain.invoke({"question": question, "context": docs})
+    exact_results = [
+        message.content for message in tool_messages
+        if message.name == TABLE_QUERY_TOOL and not message.content.startswith(TABLE_QUERY_ERROR)
+    ]
+    chunks = [
+        chunk for message in tool_messages if message.name != TABLE_QUERY_TOOL
+        for chunk in split_chunks(message.content)
+    ]
 
-    score = scored_result.binary_score
+    # Clear accepts and rejects are decided locally; only ambiguous chunks reach the LLM
+    accepted, rejected, ambiguous = relevance_prefilter.split(question, chunks)
+    scored_results = app_context.grade_chain.batch(
+        [{"question": question, "context": chunk} for chunk in ambiguous],
+        config={"max_concurrency": GRADE_CONCURRENCY},
+    )
+    graded = set(accepted) | {
+        chunk for chunk, scored_result in zip(ambiguous, scored_results)
+        if scored_result.binary_score == "yes"
+    }
+    # Keep the retrieval order
+    relevant_chunks = exact_results + [chunk for chunk in chunks if chunk in graded]
+    relevant = bool(relevant_chunks)
+    update = node_stats(
+        state, "grade_documents", started,
+        llm_calls=state.get("llm_calls", 0) + (1 if ambiguous else 0),
+        grader_calls=state.get("grader_calls", 0) + len(ambiguous),
+        retrievals=state.get("retrievals", 0) + 1,
+        relevant=relevant,
+        # Without a relevant chunk, a best-effort answer still gets the whole retrieval
+        context_chunks=relevant_chunks or chunks,
+    )
+    update["budget_exhausted"] = not relevant and not can_rewrite({**state, **update})
 
-    if score == "yes":
+    print(
+        f"---{len(relevant_chunks)}/{len(chunks)} CHUNKS RELEVANT "
+        f"({len(accepted)} accepted, {len(rejected)} rejected locally, {len(ambiguous)} graded by LLM)---"
+    )
+    print(f"Relevance prefilter: {relevance_prefilter.stats()}")
+    print(f"Retriever cache: {shared_retriever_cache.stats()}")
+    if exact_results:
+        print(f"---{len(exact_results)} EXACT TABLE QUERY RESULT(S)--- {table_store.stats()}")
+    if relevant:
         print("---DECISION: DOCS RELEVANT---")
-        return "generate"
-
     else:
         print("---DECISION: DOCS NOT RELEVANT---")
-        print(score)
-        return "rewrite"
+    return update
+
+
+def route_after_grading(state) -> Literal["generate", "rewrite"]:
+    """Generate when the documents are relevant or the budget is spent, otherwise rewrite."""
+    if state["relevant"]:
+        return "generate"
+    if state["budget_exhausted"]:
+        print("---BUDGET EXHAUSTED: GENERATE WITH BEST-EFFORT CONTEXT---")
+        return "generate"
+    return "rewrite"
 
 def rewrite(state):
     """
@@ -139,24 +380,21 @@ def rewrite(state):
     """
 
     print("---TRANSFORM QUERY---")
+    started = time.perf_counter()
     messages = state["messages"]
     question = messages[0].content
 
-    msg = [
-        HumanMessage(
-            content=f""" \n 
-    Look at the input and try to reason about the underlying semantic intent / meaning. \n 
-    Here is the initial question:
-    \n ------- \n
-    {question} 
-    \n ------- \n
-    Formulate an improved question: """,
-        )
-    ]
-
-    # Grader
-    response = llm.invoke(msg)
-    return {"messages": [response]}
+    # Rewriter
+    chain = prompt_registry.chain("rewrite-question", app_context.llm, output_parser=None)
+    response = chain.invoke({"question": question})
+    return {
+        "messages": [response],
+        **node_stats(
+            state, "rewrite", started,
+            llm_calls=state.get("llm_calls", 0) + 1,
+            rewrites=state.get("rewrites", 0) + 1,
+        ),
+    }
 
 
 def generate(state):
@@ -170,28 +408,22 @@ def generate(state):
          dict: The updated state with re-phrased question
     """
     print("---GENERATE---")
+    started = time.perf_counter()
     messages = state["messages"]
     question = messages[0].content
-    last_message = messages[-1]
-
-    docs = last_message.content
-
-    # Prompt
-    prompt = hub.pull("rlm/rag-prompt")
 
-    # LLM
-    # llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, streaming=True)
-
-    # Post-processing
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    # Only the chunks that passed grading
+    docs = "\n\n".join(state["context_chunks"])
 
     # Chain
-    rag_chain = prompt | llm | StrOutputParser()
+    rag_chain = prompt_registry.chain("rlm/rag-prompt", app_context.llm)
 
     # Run
     response = rag_chain.invoke({"context": docs, "question": question})
-    return {"messages": [response]}
+    return {
+        "messages": [response],
+        **node_stats(state, "generate", started, llm_calls=state.get("llm_calls", 0) + 1),
+    }
 
 def agent(state):
     """
@@ -205,23 +437,34 @@ def agent(state):
         dict: The updated state with the agent response appended to messages
     """
     print("---CALL AGENT---")
+    started = time.perf_counter()
     messages = state["messages"]
     # model = ChatOpenAI(temperature=0, streaming=True, model="gpt-4-turbo")
-    model = llm.bind_tools(tools)
-    response = model.invoke(messages)
+    response = app_context.model_with_tools.invoke(messages)
     # We return a list, because this will get added to the existing list
-    return {"messages": [response]}
+    return {
+        "messages": [response],
+        **node_stats(state, "agent", started, llm_calls=state.get("llm_calls", 0) + 1),
+    }
 
 from langgraph.graph import END, StateGraph, START
 from langgraph.prebuilt import ToolNode
 
+
+def retrieve(state, config):
+    """Run the retriever tool calls of the last agent message (ToolNode built on first use)."""
+    started = time.perf_counter()
+    result = app_context.tool_node.invoke(state, config)
+    return {**result, **node_stats(state, "retrieve", started)}
+
+
 # Define a new graph
 workflow = StateGraph(AgentState)
 
 # Define the nodes we will cycle between
 workflow.add_node("agent", agent)  # agent
-retrieve = ToolNode(tools)
 workflow.add_node("retrieve", retrieve)  # retrieval
+workflow.add_node("grade_documents", grade_documents)  # Grading the retrieved documents
 workflow.add_node("rewrite", rewrite)  # Re-writing the question
 workflow.add_node(
     "generate", generate
@@ -242,36 +485,51 @@ workflow.add_conditional_edges(
 )
 
 # Edges taken after the `action` node is called.
+workflow.add_edge("retrieve", "grade_documents")
 workflow.add_conditional_edges(
-    "retrieve",
-    # Assess agent decision
-    grade_documents,
+    "grade_documents",
+    # Relevant docs, or no budget left for another rewrite -> generate
+    route_after_grading,
 )
 workflow.add_edge("generate", END)
 workflow.add_edge("rewrite", "agent")
 
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from workflow_runtime import WorkflowRuntime
+from answer_cache import SemanticAnswerCache
 
 DB_URI = os.getenv("Postgres_sql_URL")
 
+# Answers to similar earlier questions, dropped whenever push/delete changes the corpus
+answer_cache = SemanticAnswerCache(hf_embeddings, version=corpus_version)
 
-async def drop_prepared_statements(conn):
-    async with conn.cursor() as cursor:
-        await cursor.execute("DEALLOCATE ALL;")
+
+def cacheable_turn(values):
+    """Only cache answers grounded in a relevant retrieval."""
+    return values.get("relevant", False) and not values.get("budget_exhausted", False)
+
+
+# One runtime per process: the checkpointer pool, schema setup and compiled graph
+# are shared by every chat turn instead of being rebuilt for each message.
+runtime = WorkflowRuntime(
+    DB_URI, workflow, turn_state=new_turn_state, answer_cache=answer_cache, cache_when=cacheable_turn
+)
 
 
 # Function to execute the workflow with a specific thread ID (conversation context)
 async def execute_workflow(input_message, thread_id):
     """Function to execute the workflow with the given input message and thread_id."""
-    async with AsyncPostgresSaver.from_conn_string(DB_URI) as checkpointer:
-        async with checkpointer.conn.transaction():
-            await drop_prepared_statements(checkpointer.conn)
-        await checkpointer.setup()
-        graph = workflow.compile(checkpointer=checkpointer)
-        # The `thread_id` here will ensure the state is saved and reused for that conversation.
-        config = {"configurable": {"thread_id": thread_id}}
-        res = await graph.ainvoke({"messages": [("human", input_message)]}, config)
-        return res
+    return await runtime.ainvoke(input_message, thread_id)
+
+
+# Streaming variant of execute_workflow for UIs and other incremental consumers
+async def stream_workflow(input_message, thread_id):
+    """
+    Execute the workflow and yield node transitions and LLM tokens as they are produced.
+
+    Yields {"type": "node"|"token"|"final", ...} events; see WorkflowRuntime.astream.
+    """
+    async for event in runtime.astream(input_message, thread_id):
+        yield event
 
 
 # Function to start a new conversation with a unique session ID
@@ -0,0 +1,24 @@
+# migrate_embeddings.py
+"""
+Re-embed the existing Chroma collection with the current embedding settings.
+
+Run after changing EMBEDDING_PREFIXES (or upgrading from a collection embedded
+without the e5 "query: "/"passage: " prefixes):
+
+    python migrate_embeddings.py --batch-size 256
+"""
+import argparse
+from chroma_db_init import EMBEDDING_SCHEME, get_file_index, reembed_collection
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed the Chroma collection with the current embedding scheme.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--force", action="store_true", help="re-embed even if the stored scheme already matches")
+    args = parser.parse_args()
+
+    stored = get_file_index().get_state("embedding_scheme")
+    if stored == EMBEDDING_SCHEME and not args.force:
+        print(f"Collection already uses the '{EMBEDDING_SCHEME}' scheme; nothing to do (use --force to re-embed anyway).")
+    else:
+        count = reembed_collection(batch_size=args.batch_size)
+        print(f"Re-embedded {count} chunks with the '{EMBEDDING_SCHEME}' scheme.")
@@ -1,9 +1,12 @@
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import json
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from io import BytesIO
 from dotenv import load_dotenv
+from db_pool import PooledConnectionProvider
 
 # Load environment variables
 load_dotenv()
@@ -11,76 +14,248 @@ load_dotenv()
 # Define database connection string
 DB_URI = os.getenv("Postgres_sql_URL")
 
-def get_db_connection():
-    """Establish and return a connection to the PostgreSQL database."""
+# Set once the uploaded_files.file_name index has been created in this process
+_uploaded_files_index_ready = False
+
+# Process-wide connection pool, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PooledConnectionProvider(DB_URI, cursor_factory=RealDictCursor)
+    return _pool
+
+@contextmanager
+def db_connection():
+    """Check a pooled connection out for the duration of a `with` block."""
+    with get_pool().connection() as conn:
+        yield conn
+
+def pool_metrics():
+    """Checkout counts, wait times and pool occupancy of the connection pool, or None if it cannot be opened."""
     try:
-        conn = psycopg2.connect(DB_URI, cursor_factory=RealDictCursor)
-        return conn
+        return get_pool().metrics()
     except Exception as e:
-        print(f"Error establishing database connection: {e}")
+        print(f"Error reading connection pool metrics: {e}")
         return None
 
+# Sidebar read model: one row per conversation thread, maintained at the end of every
+# workflow turn, so the sidebar never has to scan the checkpoints table.
+CONVERSATION_THREADS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_threads (
+    thread_id TEXT PRIMARY KEY,
+    preview TEXT,
+    last_activity TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_threads_last_activity
+    ON conversation_threads (last_activity DESC, thread_id DESC);
+"""
+
+# One-off backfill from checkpoints written before the table existed
+CONVERSATION_THREADS_BACKFILL = """
+INSERT INTO conversation_threads (thread_id, preview, last_activity)
+SELECT thread_id,
+       LEFT(
+           (ARRAY_AGG(metadata->'writes'->'__start__'->'messages'->0->>1 ORDER BY checkpoint_id)
+               FILTER (WHERE metadata->'writes' ? '__start__'))[1],
+           200
+       ),
+       COALESCE(MAX((checkpoint->>'ts')::timestamptz), NOW())
+FROM checkpoints
+WHERE checkpoint_ns = ''
+GROUP BY thread_id
+ON CONFLICT (thread_id) DO NOTHING
+"""
+
+# Transcript read model: one row per human/assistant message, so loading a
+# conversation is a single range scan on the (thread_id, seq) primary key.
+CONVERSATION_MESSAGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    thread_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (thread_id, seq)
+);
+-- Per-turn counters and node timings, stored on the assistant message of each turn
+ALTER TABLE conversation_messages ADD COLUMN IF NOT EXISTS stats JSONB;
+"""
+
+# The only setup statement for the read models, run as-is by ensure_conversation_tables and
+# WorkflowRuntime: creates both tables and, when conversation_threads did not exist yet,
+# backfills it from the checkpoints already in the database
+CONVERSATION_TABLES_SETUP = f"""
+DO $$
+DECLARE
+    backfill BOOLEAN := to_regclass('conversation_threads') IS NULL
+                        AND to_regclass('checkpoints') IS NOT NULL;
+BEGIN
+{CONVERSATION_THREADS_SCHEMA}
+{CONVERSATION_MESSAGES_SCHEMA}
+    IF backfill THEN
+{CONVERSATION_THREADS_BACKFILL};
+    END IF;
+END
+$$;
+"""
+
+# Held until the end of the transaction that appends to a thread. MAX(seq) is read under
+# READ COMMITTED, so without it two concurrent turns on one thread get the same seq and the
+# second fails on the primary key. Param: thread_id
+LOCK_CONVERSATION_THREAD = "SELECT pg_advisory_xact_lock(hashtext('conversation_messages'), hashtext(%s))"
+
+# Appends messages after the thread's current last seq; params: thread_id (twice), then
+# a JSON array of {"role": ..., "content": ..., "stats": {...} (optional)} objects
+APPEND_CONVERSATION_MESSAGES = """
+INSERT INTO conversation_messages (thread_id, seq, role, content, stats)
+SELECT %s, last.seq + m.ordinality, m.value->>'role', m.value->>'content', m.value->'stats'
+FROM (SELECT COALESCE(MAX(seq), 0) AS seq FROM conversation_messages WHERE thread_id = %s) AS last,
+     jsonb_array_elements(%s::jsonb) WITH ORDINALITY AS m(value, ordinality)
+"""
+
+# Called at the end of every turn: the first message of a thread becomes its preview
+RECORD_THREAD_ACTIVITY = """
+INSERT INTO conversation_threads (thread_id, preview, last_activity)
+VALUES (%s, LEFT(%s, 200), NOW())
+ON CONFLICT (thread_id) DO UPDATE SET last_activity = EXCLUDED.last_activity
+"""
+
+_conversation_tables_ready = False
+
+def ensure_conversation_tables():
+    """Create the conversation read-model tables (backfilling conversation_threads on creation), once per process."""
+    global _conversation_tables_ready
+    if _conversation_tables_ready:
+        return
+
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(CONVERSATION_TABLES_SETUP)
+            conn.commit()
+            _conversation_tables_ready = True
+    except Exception as e:
+        print(f"Error preparing conversation tables: {e}")
+
+def fetch_conversation_page(limit=50, before=None):
+    """
+    Fetch one page of conversation threads for the sidebar, most recently active first.
+
+    Args:
+        limit (int): Maximum number of threads to return
+        before (dict): Last row of the previous page (keyset pagination), or None for the first page
+
+    Returns:
+        list[dict]: Rows with thread_id, last_activity and preview
+    """
+    ensure_conversation_tables()
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            if before is None:
+                cursor.execute(
+                    """
+                    SELECT thread_id, last_activity, preview
+                    FROM conversation_threads
+                    ORDER BY last_activity DESC, thread_id DESC
+                    LIMIT %s
+                    """,
+                    (limit,),
+                )
+            else:
+                cursor.execute(
+                    """
+                    SELECT thread_id, last_activity, preview
+                    FROM conversation_threads
+                    WHERE (last_activity, thread_id) < (%s, %s)
+                    ORDER BY last_activity DESC, thread_id DESC
+                    LIMIT %s
+                    """,
+                    (before['last_activity'], before['thread_id'], limit),
+                )
+            return cursor.fetchall()
+    except Exception as e:
+        print(f"Error fetching conversation page: {e}")
+        return []
+
 def fetch_conversation_by_thread(thread_id):
     """Fetch all checkpoints for a given thread (thread_id) from PostgreSQL."""
-    conn = get_db_connection()
-    if conn is None:
-        return []
-    
     try:
-        cursor = conn.cursor()
-        query = """
-        SELECT thread_id, metadata
-        FROM checkpoints
-        WHERE thread_id = %s
-        ORDER BY checkpoint_id ASC  -- Ensure 'checkpoint_id' is indexed for performance
-        """
-        cursor.execute(query, (thread_id,))
-        checkpoints = cursor.fetchall()
-        return checkpoints
+        with db_connection() as conn, conn.cursor() as cursor:
+            query = """
+            SELECT thread_id, metadata
+            FROM checkpoints
+            WHERE thread_id = %s
+            ORDER BY checkpoint_id ASC  -- Ensure 'checkpoint_id' is indexed for performance
+            """
+            cursor.execute(query, (thread_id,))
+            checkpoints = cursor.fetchall()
+            return checkpoints
     except Exception as e:
         print(f"Error fetching conversation: {e}")
         return []
-    finally:
-        cursor.close()
-        conn.close()
-
-def fetch_all_conversations():
-    """Fetch all conversation threads from the database."""
-    conn = get_db_connection()
-    if conn is None:
-        return []
-    
+
+def messages_from_checkpoints(checkpoints):
+    """Rebuild a human/assistant transcript from checkpoint metadata (for threads older than conversation_messages)."""
+    messages = []
+    for checkpoint in checkpoints:
+        writes = checkpoint['metadata'].get("writes") or {}
+        if '__start__' in writes:
+            messages.append({"role": "human", "content": writes['__start__']['messages'][0][1]})
+        if 'generate' in writes:
+            messages.append({"role": "assistant", "content": writes['generate']['messages'][0]})
+        elif 'agent' in writes and 'messages' in writes['agent']:
+            content = writes['agent']['messages'][0]['kwargs'].get('content')
+            if content:
+                messages.append({"role": "assistant", "content": content})
+    return messages
+
+def fetch_conversation_messages(thread_id):
+    """
+    Fetch a conversation's transcript as [{'role': ..., 'content': ...}] in order.
+
+    Threads recorded before conversation_messages existed are converted from their
+    checkpoints once and stored, so later loads use the indexed range scan too.
+    """
+    ensure_conversation_tables()
     try:
-        cursor = conn.cursor()
-        # Check if 'created_at' column exists
-        query = "SELECT DISTINCT thread_id FROM checkpoints ORDER BY thread_id DESC"  # Adjusted for simplicity
-        cursor.execute(query)
-        conversations = cursor.fetchall()
-        return conversations
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT role, content FROM conversation_messages WHERE thread_id = %s ORDER BY seq",
+                (thread_id,),
+            )
+            messages = cursor.fetchall()
+        if messages:
+            return messages
+
+        messages = messages_from_checkpoints(fetch_conversation_by_thread(thread_id))
+        if messages:
+            with db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute(LOCK_CONVERSATION_THREAD, (thread_id,))
+                cursor.execute(APPEND_CONVERSATION_MESSAGES, (thread_id, thread_id, json.dumps(messages)))
+                conn.commit()
+        return messages
     except Exception as e:
-        print(f"Error fetching conversations: {e}")
+        print(f"Error fetching conversation messages: {e}")
         return []
-    finally:
-        cursor.close()
-        conn.close()
 
 def delete_conversation(thread_id):
     """Delete a conversation and its messages from the database."""
-    conn = get_db_connection()
-    if conn is None:
-        return
-    
+    ensure_conversation_tables()
     try:
-        cursor = conn.cursor()
-        # Delete checkpoints related to the thread_id
-        cursor.execute("DELETE FROM checkpoints WHERE thread_id = %s", (thread_id,))
-        conn.commit()
-        print(f"Conversation with thread_id {thread_id} has been deleted.")
+        with db_connection() as conn, conn.cursor() as cursor:
+            # Delete checkpoints related to the thread_id
+            cursor.execute("DELETE FROM checkpoints WHERE thread_id = %s", (thread_id,))
+            cursor.execute("DELETE FROM conversation_threads WHERE thread_id = %s", (thread_id,))
+            cursor.execute("DELETE FROM conversation_messages WHERE thread_id = %s", (thread_id,))
+            conn.commit()
+            print(f"Conversation with thread_id {thread_id} has been deleted.")
     except Exception as e:
         print(f"Error deleting conversation: {e}")
-    finally:
-        cursor.close()
-        conn.close()
 
 def save_uploaded_file(file, directory='./uploaded_files/'):
     """Save the uploaded file locally and store its metadata in the database."""
@@ -94,61 +269,73 @@ def save_uploaded_file(file, directory='./uploaded_files/'):
         f.write(file.getbuffer())
     
     # Save metadata to the database (only file name and path)
-    conn = get_db_connection()
-    if conn is None:
-        return
-    
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO uploaded_files (file_name, file_path, created_at)
-            VALUES (%s, %s, %s)
-            """,
-            (file.name, file_path, datetime.now())
-        )
-        conn.commit()
-        print(f"File {file.name} saved locally and metadata stored in the database.")
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO uploaded_files (file_name, file_path, created_at)
+                VALUES (%s, %s, %s)
+                """,
+                (file.name, file_path, datetime.now())
+            )
+            conn.commit()
+            print(f"File {file.name} saved locally and metadata stored in the database.")
     except Exception as e:
         print(f"Error saving uploaded file metadata: {e}")
-    finally:
-        cursor.close()
-        conn.close()
 
 def delete_uploaded_file(file_name):
     """Delete an uploaded file from the uploaded_files table in the database."""
-    conn = get_db_connection()
-    if conn is None:
-        return
-    
     try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM uploaded_files WHERE file_name = %s", (file_name,))
-        conn.commit()
-        print(f"File {file_name} deleted successfully.")
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM uploaded_files WHERE file_name = %s", (file_name,))
+            conn.commit()
+            print(f"File {file_name} deleted successfully.")
     except Exception as e:
         print(f"Error deleting uploaded file: {e}")
-    finally:
-        cursor.close()
-        conn.close()
 
 def fetch_uploaded_files():
     """Fetch all uploaded file metadata from the uploaded_files table in the database."""
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT file_name, file_path FROM uploaded_files")
+            files = cursor.fetchall()
+            return files  # Returns a list of dictionaries with file_name and file_path
+    except Exception as e:
+        print(f"Error fetching uploaded files: {e}")
         return []
-    
+
+def ensure_uploaded_files_index():
+    """Create the index on uploaded_files.file_name used by name lookups (once per process)."""
+    global _uploaded_files_index_ready
+    if _uploaded_files_index_ready:
+        return
+
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_uploaded_files_file_name ON uploaded_files (file_name)")
+            conn.commit()
+            _uploaded_files_index_ready = True
+    except Exception as e:
+        print(f"Error creating uploaded_files index: {e}")
+
+def fetch_uploaded_files_by_name(file_names):
+    """Fetch uploaded file metadata for several file names with one query."""
+    file_names = list(file_names)
+    if not file_names:
+        return []
+    ensure_uploaded_files_index()
+
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT file_name, file_path FROM uploaded_files")
-        files = cursor.fetchall()
-        return files  # Returns a list of dictionaries with file_name and file_path
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT file_name, file_path FROM uploaded_files WHERE file_name = ANY(%s)",
+                (file_names,),
+            )
+            files = cursor.fetchall()
+            return files  # Returns a list of dictionaries with file_name and file_path
     except Exception as e:
         print(f"Error fetching uploaded files: {e}")
         return []
-    finally:
-        cursor.close()
-        conn.close()
 
 # def fetch_uploaded_file_content(file_name):
 #     """Fetch the content of the uploaded file from the PostgreSQL database."""
@@ -0,0 +1,117 @@
+# prompt_registry.py
+import json
+import os
+from langchain_core.load import dumpd, load
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+
+PROMPT_CACHE_DIR = './prompt_cache'
+
+# Vendored copies of every prompt the graph uses, so the app works without
+# network access. "rlm/rag-prompt" mirrors the LangChain Hub prompt of that name.
+VENDORED_PROMPTS = {
+    "rlm/rag-prompt": ChatPromptTemplate.from_messages([
+        (
+            "human",
+            "You are an assistant for question-answering tasks. Use the following pieces of retrieved context "
+            "to answer the question. If you don't know the answer, just say that you don't know. Use three "
+            "sentences maximum and keep the answer concise.\nQuestion: {question} \nContext: {context} \nAnswer:",
+        )
+    ]),
+    "grade-documents": PromptTemplate(
+        template="""You are a grader assessing relevance of a retrieved document to a user question. \n
+        Here is the retrieved document: \n\n {context} \n\n
+        Here is the user question: {question} \n
+        If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
+        Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
+        input_variables=["context", "question"],
+    ),
+    "rewrite-question": ChatPromptTemplate.from_messages([
+        (
+            "human",
+            """ \n
+    Look at the input and try to reason about the underlying semantic intent / meaning. \n
+    Here is the initial question:
+    \n ------- \n
+    {question}
+    \n ------- \n
+    Formulate an improved question: """,
+        )
+    ]),
+}
+
+# Prompts that may be refreshed from LangChain Hub; the others only exist locally.
+HUB_PROMPTS = {"rlm/rag-prompt"}
+
+
+class PromptRegistry:
+    """Loads each prompt once and hands out pre-built chains.
+
+    Lookup order is: in-memory, on-disk cache, vendored copy. The hub is only
+    contacted by `refresh`, which also updates the on-disk cache.
+    """
+
+    def __init__(self, cache_dir=PROMPT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._prompts = {}
+        self._chains = {}
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, name.replace("/", "__") + ".json")
+
+    def _load_cached(self, name):
+        path = self._cache_path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return load(json.load(f))
+        except Exception as e:
+            print(f"Ignoring unreadable prompt cache {path}: {e}")
+            return None
+
+    def get_prompt(self, name):
+        """Return the prompt template registered under `name`."""
+        if name not in self._prompts:
+            prompt = self._load_cached(name) or VENDORED_PROMPTS.get(name)
+            if prompt is None:
+                raise KeyError(f"Unknown prompt: {name}")
+            self._prompts[name] = prompt
+        return self._prompts[name]
+
+    def refresh(self, name):
+        """Pull `name` from LangChain Hub, store it in the disk cache and drop stale chains."""
+        if name not in HUB_PROMPTS:
+            raise KeyError(f"Prompt {name} is not published on the hub")
+        from langchain import hub
+
+        prompt = hub.pull(name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._cache_path(name), "w", encoding="utf-8") as f:
+            json.dump(dumpd(prompt), f)
+
+        self._prompts[name] = prompt
+        self._chains = {key: chain for key, chain in self._chains.items() if key[0] != name}
+        return prompt
+
+    def refresh_all(self):
+        """Best-effort refresh of every hub prompt; failures keep the local copy."""
+        for name in HUB_PROMPTS:
+            try:
+                self.refresh(name)
+            except Exception as e:
+                print(f"Could not refresh prompt {name} from the hub, using local copy: {e}")
+
+    def chain(self, name, llm, output_parser=StrOutputParser()):
+        """Return a cached `prompt | llm | output_parser` chain (no parser if `output_parser` is None)."""
+        key = (name, id(llm), id(output_parser))
+        if key not in self._chains:
+            chain = self.get_prompt(name) | llm
+            if output_parser is not None:
+                chain = chain | output_parser
+            # The cached chain holds llm and the parser, so their ids stay unique while cached
+            self._chains[key] = chain
+        return self._chains[key]
+
+
+prompt_registry = PromptRegistry()
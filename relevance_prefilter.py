@@ -0,0 +1,80 @@
+# relevance_prefilter.py
+import math
+import os
+import threading
+
+# Off by default: chunks built from one CSV template have very similar embeddings, so fixed
+# cutoffs can reject relevant chunks or accept irrelevant ones unseen by the LLM grader.
+# Calibrate the thresholds on your data with benchmarks/bench_relevance_prefilter.py first.
+RELEVANCE_PREFILTER = os.getenv("RELEVANCE_PREFILTER", "false").lower() == "true"
+# Cosine similarity between the question and a chunk at or above which the chunk is
+# accepted without the LLM grader, and at or below which it is rejected without it
+RELEVANCE_ACCEPT_THRESHOLD = float(os.getenv("RELEVANCE_ACCEPT_THRESHOLD", "0.86"))
+RELEVANCE_REJECT_THRESHOLD = float(os.getenv("RELEVANCE_REJECT_THRESHOLD", "0.74"))
+
+
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class RelevancePrefilter:
+    """
+    Local relevance scoring that runs before the LLM grader.
+
+    The question and the retrieved chunks are compared by embedding cosine
+    similarity. Chunks that clearly match or clearly do not are decided here;
+    only the ambiguous ones between the two thresholds go to the LLM grader.
+    Chunk vectors normally come straight from the embedding cache, since the
+    same text was embedded at ingest time.
+    """
+
+    def __init__(self, embeddings, accept_threshold=RELEVANCE_ACCEPT_THRESHOLD,
+                 reject_threshold=RELEVANCE_REJECT_THRESHOLD, enabled=RELEVANCE_PREFILTER):
+        if reject_threshold > accept_threshold:
+            raise ValueError("reject_threshold must not be greater than accept_threshold")
+        self.embeddings = embeddings
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._metrics = {"queries": 0, "chunks": 0, "accepted": 0, "rejected": 0, "escalated": 0}
+
+    def split(self, question, chunks):
+        """
+        Return (accepted, rejected, ambiguous) lists of chunks.
+
+        When the prefilter is disabled every chunk is ambiguous, i.e. goes to the LLM grader.
+        """
+        if not self.enabled or not chunks:
+            accepted, rejected, ambiguous = [], [], list(chunks)
+        else:
+            query_vector = self.embeddings.embed_query(question)
+            chunk_vectors = self.embeddings.embed_documents(list(chunks))
+            accepted, rejected, ambiguous = [], [], []
+            for chunk, vector in zip(chunks, chunk_vectors):
+                score = cosine_similarity(query_vector, vector)
+                if score >= self.accept_threshold:
+                    accepted.append(chunk)
+                elif score <= self.reject_threshold:
+                    rejected.append(chunk)
+                else:
+                    ambiguous.append(chunk)
+
+        with self._lock:
+            self._metrics["queries"] += 1
+            self._metrics["chunks"] += len(chunks)
+            self._metrics["accepted"] += len(accepted)
+            self._metrics["rejected"] += len(rejected)
+            self._metrics["escalated"] += len(ambiguous)
+        return accepted, rejected, ambiguous
+
+    def stats(self):
+        """Decision counts for this process and the LLM grader calls saved per 1k queries."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        saved = metrics["accepted"] + metrics["rejected"]
+        metrics["llm_calls_saved"] = saved
+        metrics["llm_calls_saved_per_1k_queries"] = saved * 1000 / metrics["queries"] if metrics["queries"] else 0.0
+        return metrics
@@ -0,0 +1,86 @@
+# retriever_cache.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from embedding_cache import normalize_text
+
+RETRIEVER_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVER_CACHE_MAX_ENTRIES", "2048"))
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search query."""
+    return " ".join(normalize_text(query).lower().split())
+
+
+class RetrieverCache:
+    """
+    Thread-safe LRU of retrieval results keyed by (corpus version, normalized query).
+
+    Results from an older corpus version are never returned; they simply age out
+    of the LRU. One instance can be shared by several CachedRetriever objects.
+    """
+
+    def __init__(self, max_entries=RETRIEVER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            documents = self._entries.get(key)
+            if documents is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(documents)
+
+    def put(self, key, documents):
+        with self._lock:
+            self._entries[key] = list(documents)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+
+# Process-wide cache shared by every retriever that does not bring its own
+shared_retriever_cache = RetrieverCache()
+
+
+class CachedRetriever(BaseRetriever):
+    """Retriever wrapper that serves repeated queries from a RetrieverCache."""
+
+    retriever: BaseRetriever
+    # Returns the current corpus generation, bumped on every ingest or delete
+    version: Callable[[], Any]
+    cache: Any = shared_retriever_cache
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        key = (self.version(), normalize_query(query))
+        documents = self.cache.get(key)
+        if documents is None:
+            documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+            self.cache.put(key, documents)
+        return documents
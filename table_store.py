@@ -0,0 +1,341 @@
+# table_store.py
+import csv
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Literal, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+TABLE_QUERY_CACHE_MAX_ENTRIES = int(os.getenv("TABLE_QUERY_CACHE_MAX_ENTRIES", "256"))
+# Rows returned to the LLM at most; aggregates are always computed over every matching row
+TABLE_QUERY_MAX_ROWS = int(os.getenv("TABLE_QUERY_MAX_ROWS", "50"))
+
+AGGREGATES = ("sum", "mean", "min", "max", "count")
+
+
+class QueryFilter(BaseModel):
+    """One row filter. Compare `column` with `value`, `values` (for "in") or another column."""
+
+    column: str = Field(description="Column to filter on, e.g. 'Department'")
+    op: Literal["==", "!=", ">", ">=", "<", "<=", "in", "contains"] = Field(description="Comparison operator")
+    value: Optional[str] = Field(default=None, description="Value to compare with, e.g. 'Marketing' or '20000'")
+    values: Optional[List[str]] = Field(default=None, description="Values for the 'in' operator, e.g. ['January', 'February', 'March']")
+    other_column: Optional[str] = Field(default=None, description="Compare with this column instead of a value, e.g. 'Budget'")
+
+
+class QueryAggregate(BaseModel):
+    """An aggregate over a numeric column, or over the difference of two columns."""
+
+    aggregate: Literal["sum", "mean", "min", "max", "count"] = Field(description="Aggregate function")
+    column: Optional[str] = Field(default=None, description="Numeric column, e.g. 'Expenses'; not needed for count")
+    minus_column: Optional[str] = Field(default=None, description="Subtract this column first, e.g. 'Budget' for Actuals - Budget")
+
+
+class TableQuery(BaseModel):
+    """Filter, group and aggregate query over the uploaded finance CSV files."""
+
+    file_names: Optional[List[str]] = Field(default=None, description="Files to query; all files when omitted")
+    filters: List[QueryFilter] = Field(default_factory=list, description="Row filters, combined with AND")
+    group_by: List[str] = Field(default_factory=list, description="Columns to group by, e.g. ['Department']")
+    aggregates: List[QueryAggregate] = Field(default_factory=list, description="Aggregates to compute; matching rows are listed when empty")
+    order_by: Optional[str] = Field(default=None, description="Output column to sort by, e.g. 'sum(Expenses)'")
+    descending: bool = Field(default=True, description="Sort order for order_by")
+    limit: Optional[int] = Field(default=None, description="Maximum number of output rows")
+
+
+def _to_number(value):
+    value = value.strip().replace(",", "")
+    return float(value) if value else np.nan
+
+
+def _to_array(values):
+    """
+    Numeric column as float64 when every non-blank value parses, otherwise an object array
+    of strings. Blank cells of a numeric column become NaN, which aggregates skip.
+    """
+    if any(value.strip() for value in values):
+        try:
+            return np.array([_to_number(value) for value in values], dtype=np.float64)
+        except ValueError:
+            pass
+    return np.array([value.strip() for value in values], dtype=object)
+
+
+def load_table(path):
+    """Read a CSV file into {column name: numpy array}."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [column.strip() for column in next(reader, [])]
+        values = [[] for _ in header]
+        for row in reader:
+            if not row:
+                continue
+            for i, column in enumerate(values):
+                column.append(row[i] if i < len(row) else "")
+    return {name: _to_array(column) for name, column in zip(header, values)}
+
+
+def read_header(path):
+    """Column names of a CSV file, without reading its rows."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return [column.strip() for column in next(csv.reader(f), [])]
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _resolve(columns, name):
+    """Case-insensitive column lookup with a helpful error for the LLM."""
+    for column in columns:
+        if column.lower() == name.strip().lower():
+            return column
+    raise ValueError(f"Unknown column {name!r}; available columns: {', '.join(columns)}")
+
+
+def _is_numeric(array):
+    return array.dtype != object
+
+
+def _compare(left, op, right):
+    if op == "==":
+        return left == right
+    if op == "!=":
+        return left != right
+    if op == ">":
+        return left > right
+    if op == ">=":
+        return left >= right
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    raise ValueError(f"Unsupported operator {op!r}")
+
+
+def _as_operand(array, value):
+    if _is_numeric(array):
+        try:
+            return float(str(value).replace(",", ""))
+        except ValueError:
+            raise ValueError(f"{value!r} is not a number") from None
+    return str(value).strip().lower()
+
+
+def _filter_mask(columns, query_filter):
+    array = columns[_resolve(columns, query_filter.column)]
+    text = None if _is_numeric(array) else np.array([value.lower() for value in array], dtype=object)
+    left = array if text is None else text
+
+    if query_filter.other_column:
+        other = columns[_resolve(columns, query_filter.other_column)]
+        if _is_numeric(other) != _is_numeric(array):
+            raise ValueError(f"Cannot compare {query_filter.column!r} with {query_filter.other_column!r}")
+        right = other if _is_numeric(other) else np.array([value.lower() for value in other], dtype=object)
+        return np.asarray(_compare(left, query_filter.op, right), dtype=bool)
+
+    if query_filter.op == "in":
+        operands = {_as_operand(array, value) for value in (query_filter.values or [])}
+        return np.array([value in operands for value in left], dtype=bool)
+    if query_filter.value is None:
+        raise ValueError(f"Filter on {query_filter.column!r} needs a value, values or other_column")
+    if query_filter.op == "contains":
+        needle = str(query_filter.value).strip().lower()
+        return np.array([needle in str(value).lower() for value in left], dtype=bool)
+    return np.asarray(_compare(left, query_filter.op, _as_operand(array, query_filter.value)), dtype=bool)
+
+
+def _aggregate_name(aggregate):
+    if aggregate.aggregate == "count" and not aggregate.column:
+        return "count(*)"
+    expression = aggregate.column if not aggregate.minus_column else f"{aggregate.column} - {aggregate.minus_column}"
+    return f"{aggregate.aggregate}({expression})"
+
+
+def _aggregate_values(columns, aggregate):
+    if not aggregate.column:
+        if aggregate.aggregate != "count":
+            raise ValueError(f"{aggregate.aggregate} needs a column")
+        return None
+    values = columns[_resolve(columns, aggregate.column)]
+    if aggregate.minus_column:
+        values = values - columns[_resolve(columns, aggregate.minus_column)] if _is_numeric(values) else values
+    if not _is_numeric(values) and aggregate.aggregate != "count":
+        raise ValueError(f"Column {aggregate.column!r} is not numeric")
+    return values
+
+
+def _reduce(function, values, inverse, n_groups):
+    # Blank cells (NaN) are left out, like NULLs in SQL; count(*) passes values=None
+    if values is not None and _is_numeric(values):
+        present = ~np.isnan(values)
+        values, inverse = values[present], inverse[present]
+    counts = np.bincount(inverse, minlength=n_groups)
+    if function == "count":
+        return counts
+    if function == "sum":
+        return np.bincount(inverse, weights=values, minlength=n_groups)
+    if function == "mean":
+        return np.bincount(inverse, weights=values, minlength=n_groups) / np.where(counts, counts, np.nan)
+    result = np.full(n_groups, np.inf if function == "min" else -np.inf)
+    (np.minimum if function == "min" else np.maximum).at(result, inverse, values)
+    # Groups without a single value have no min/max
+    return np.where(counts, result, np.nan)
+
+
+def _plain(value):
+    if isinstance(value, (np.floating, float)):
+        value = float(value)
+        if np.isnan(value):
+            return None
+        return int(value) if value.is_integer() else round(value, 4)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def run_query(columns, query):
+    """
+    Execute a TableQuery over {column: array}.
+
+    Returns:
+        dict: "rows" (list of dicts, at most TABLE_QUERY_MAX_ROWS), "matched_rows" and "total_rows"
+    """
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    mask = np.ones(n_rows, dtype=bool)
+    for query_filter in query.filters:
+        mask &= _filter_mask(columns, query_filter)
+    selected = {name: array[mask] for name, array in columns.items()}
+    matched = int(mask.sum())
+
+    if not query.aggregates:
+        output_columns = [_resolve(columns, name) for name in query.group_by] or list(columns)
+        rows = [
+            {name: _plain(selected[name][i]) for name in output_columns}
+            for i in range(matched)
+        ]
+    else:
+        group_columns = [_resolve(columns, name) for name in query.group_by]
+        keys = list(zip(*[selected[name] for name in group_columns])) if group_columns else [()] * matched
+        groups = {}
+        inverse = np.fromiter((groups.setdefault(key, len(groups)) for key in keys), dtype=np.int64, count=len(keys))
+        if not group_columns and not groups:
+            groups[()] = 0
+        results = {}
+        for aggregate in query.aggregates:
+            values = _aggregate_values(selected, aggregate)
+            results[_aggregate_name(aggregate)] = _reduce(aggregate.aggregate, values, inverse, len(groups))
+        rows = [
+            {
+                **{name: _plain(value) for name, value in zip(group_columns, key)},
+                **{name: _plain(result[index]) for name, result in results.items()},
+            }
+            for key, index in groups.items()
+        ]
+
+    if query.order_by:
+        order_by = next((name for name in (rows[0] if rows else {}) if name.lower() == query.order_by.strip().lower()), None)
+        if order_by is None and rows:
+            raise ValueError(f"Cannot order by {query.order_by!r}; output columns: {', '.join(rows[0])}")
+        if order_by:
+            # Blank values (None) go last in either direction
+            rows = sorted(
+                (row for row in rows if row[order_by] is not None), key=lambda row: row[order_by], reverse=query.descending
+            ) + [row for row in rows if row[order_by] is None]
+    limit = min(query.limit or TABLE_QUERY_MAX_ROWS, TABLE_QUERY_MAX_ROWS)
+    return {"rows": rows[:limit], "matched_rows": matched, "total_rows": n_rows, "truncated": len(rows) > limit}
+
+
+class TableStore:
+    """
+    Columnar (numpy) copies of the CSV files in the vector database, for exact queries.
+
+    `resolve_paths()` returns {file_name: path} for the queryable files. A file
+    is re-read only when its version (mtime, size) changes, and query results
+    are cached in an LRU keyed by the queried files' versions, so re-uploading
+    a file invalidates its cached results.
+    """
+
+    def __init__(self, resolve_paths, max_entries=TABLE_QUERY_CACHE_MAX_ENTRIES):
+        self.resolve_paths = resolve_paths
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._tables = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _table(self, file_name, path):
+        version = file_version(path)
+        with self._lock:
+            cached = self._tables.get(file_name)
+            if cached and cached[0] == (path, version):
+                return version, cached[1]
+        columns = load_table(path)
+        with self._lock:
+            self._tables[file_name] = ((path, version), columns)
+        return version, columns
+
+    def schema(self):
+        """{file_name: [column names]} of every queryable file, read from the headers only."""
+        return {file_name: read_header(path) for file_name, path in self.resolve_paths().items()}
+
+    def _paths(self, file_names):
+        paths = self.resolve_paths()
+        if file_names:
+            missing = [name for name in file_names if name not in paths]
+            if missing:
+                raise ValueError(f"Unknown file(s) {', '.join(missing)}; available files: {', '.join(paths)}")
+            paths = {name: paths[name] for name in file_names}
+        if not paths:
+            raise ValueError("No CSV files are available to query")
+        return dict(sorted(paths.items()))
+
+    def _combined(self, paths):
+        tables = [(file_name, self._table(file_name, path)[1]) for file_name, path in paths.items()]
+        names = list(tables[0][1])
+        if any(list(columns) != names for _, columns in tables[1:]):
+            raise ValueError("The selected files have different columns; query them one at a time")
+        combined = {"file_name": np.concatenate([
+            np.full(len(next(iter(columns.values()), [])), file_name, dtype=object) for file_name, columns in tables
+        ])}
+        for name in names:
+            arrays = [columns[name] for _, columns in tables]
+            if len({_is_numeric(array) for array in arrays}) > 1:
+                arrays = [array.astype(str).astype(object) for array in arrays]
+            combined[name] = np.concatenate(arrays)
+        return combined
+
+    def query(self, query):
+        """Run a TableQuery, serving repeated queries on unchanged files from the cache."""
+        paths = self._paths(query.file_names)
+        # Keyed on the files' versions (a stat each), so hits never touch the tables
+        versions = tuple((file_name, file_version(path)) for file_name, path in paths.items())
+        key = (versions, json.dumps(query.model_dump(), sort_keys=True))
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+
+        result = run_query(self._combined(paths), query)
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "tables": len(self._tables),
+            "cached_results": len(self._results),
+        }
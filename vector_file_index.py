@@ -0,0 +1,144 @@
+# vector_file_index.py
+import os
+import sqlite3
+import threading
+
+FILE_INDEX_NAME = "file_index.sqlite3"
+
+
+class VectorFileIndex:
+    """
+    Sidecar table mapping file names to the Chroma chunk ids stored for them.
+
+    It lives next to the Chroma data in the persist directory, so it is removed
+    together with the collection. Listing files and looking up a file's chunks
+    read only this table, instead of pulling every vector's metadata from Chroma.
+    """
+
+    def __init__(self, persist_dir):
+        os.makedirs(persist_dir, exist_ok=True)
+        self.path = os.path.join(persist_dir, FILE_INDEX_NAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS file_chunks (
+                file_name TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (file_name, chunk_id)
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                file_name TEXT PRIMARY KEY,
+                chunk_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS index_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _adjust_count(self, file_name, delta):
+        # Incremental, from the rowcount of the batch just written, so ingesting a large
+        # file in batches never recounts its chunks; files without chunks are removed
+        if delta:
+            self._conn.execute(
+                """
+                INSERT INTO files (file_name, chunk_count) VALUES (?, ?)
+                ON CONFLICT (file_name) DO UPDATE SET chunk_count = chunk_count + excluded.chunk_count
+                """,
+                (file_name, delta),
+            )
+        self._conn.execute("DELETE FROM files WHERE file_name = ? AND chunk_count <= 0", (file_name,))
+
+    def add(self, file_name, chunk_ids):
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO file_chunks (file_name, chunk_id) VALUES (?, ?)",
+                [(file_name, chunk_id) for chunk_id in chunk_ids],
+            )
+            self._adjust_count(file_name, cursor.rowcount)
+            self._conn.commit()
+
+    def remove(self, file_name, chunk_ids):
+        with self._lock:
+            cursor = self._conn.executemany(
+                "DELETE FROM file_chunks WHERE file_name = ? AND chunk_id = ?",
+                [(file_name, chunk_id) for chunk_id in chunk_ids],
+            )
+            self._adjust_count(file_name, -cursor.rowcount)
+            self._conn.commit()
+
+    def drop_file(self, file_name):
+        with self._lock:
+            self._conn.execute("DELETE FROM file_chunks WHERE file_name = ?", (file_name,))
+            self._conn.execute("DELETE FROM files WHERE file_name = ?", (file_name,))
+            self._conn.commit()
+
+    def chunk_ids(self, file_name):
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_id FROM file_chunks WHERE file_name = ?", (file_name,)).fetchall()
+        return [row[0] for row in rows]
+
+    def files(self):
+        """Distinct file names with their chunk counts, ordered by name."""
+        with self._lock:
+            rows = self._conn.execute("SELECT file_name, chunk_count FROM files ORDER BY file_name").fetchall()
+        return [{"file_name": file_name, "chunk_count": chunk_count} for file_name, chunk_count in rows]
+
+    def get_state(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def corpus_version(self):
+        """Counter bumped whenever the collection's content changes; caches key on it."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM index_state WHERE key = 'corpus_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def bump_corpus_version(self):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO index_state (key, value) VALUES ('corpus_version', '1')
+                ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+                """
+            )
+            self._conn.commit()
+
+    def is_built(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM index_state WHERE key = 'built'").fetchone()
+        return row is not None
+
+    def rebuild(self, vectorstore, page_size=5000):
+        """One-off backfill from an existing collection, paging through its metadata."""
+        with self._lock:
+            self._conn.execute("DELETE FROM file_chunks")
+            self._conn.execute("DELETE FROM files")
+            offset = 0
+            while True:
+                page = vectorstore.get(include=['metadatas'], limit=page_size, offset=offset)
+                if not page['ids']:
+                    break
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO file_chunks (file_name, chunk_id) VALUES (?, ?)",
+                    [
+                        (metadata['file_name'], doc_id)
+                        for doc_id, metadata in zip(page['ids'], page['metadatas'])
+                        if metadata and 'file_name' in metadata
+                    ],
+                )
+                offset += len(page['ids'])
+            self._conn.execute(
+                "INSERT INTO files (file_name, chunk_count) SELECT file_name, COUNT(*) FROM file_chunks GROUP BY file_name"
+            )
+            self._conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES ('built', '1')")
+            self._conn.commit()
@@ -0,0 +1,210 @@
+# workflow_runtime.py
+import asyncio
+import json
+from langchain_core.messages import AIMessage, HumanMessage
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from postgresSQL import (
+    APPEND_CONVERSATION_MESSAGES,
+    CONVERSATION_TABLES_SETUP,
+    LOCK_CONVERSATION_THREAD,
+    RECORD_THREAD_ACTIVITY,
+)
+
+# Graph nodes whose LLM tokens are forwarded by `astream`
+STREAM_NODES = ("agent", "generate")
+# Node that cached answers are recorded as, so the checkpointed thread continues normally
+ANSWER_NODE = "generate"
+
+# Connection settings required by AsyncPostgresSaver. prepare_threshold=0 stops
+# psycopg from creating server-side prepared statements, which is what the old
+# "DEALLOCATE ALL" workaround was cleaning up before every turn.
+CONNECTION_KWARGS = {
+    "autocommit": True,
+    "prepare_threshold": 0,
+    "row_factory": dict_row,
+}
+
+
+class WorkflowRuntime:
+    """Long-lived owner of the pooled checkpointer and the compiled graph.
+
+    The pool, the checkpointer schema setup and the compiled graph are created
+    once and reused by every call to `ainvoke`. Because psycopg pools are bound
+    to the event loop that opened them, the pool is reopened (without running
+    `setup()` again) if the runtime is used from a different loop.
+    """
+
+    def __init__(self, db_uri, workflow, min_size=1, max_size=10, turn_state=dict,
+                 answer_cache=None, cache_when=None, answer_node=ANSWER_NODE, record_read_models=True):
+        self.db_uri = db_uri
+        self.workflow = workflow
+        # Callable returning state merged into every turn's input (e.g. zeroed counters);
+        # the same keys are read back from the final state and recorded with the answer
+        self.turn_state = turn_state
+        # Optional SemanticAnswerCache consulted before running a thread's first turn; `cache_when(values)`
+        # decides from a finished turn's final state whether its answer may be cached
+        self.answer_cache = answer_cache
+        self.cache_when = cache_when or (lambda values: True)
+        self.answer_node = answer_node
+        # Write conversation_messages/conversation_threads after every turn (off for benchmarks)
+        self.record_read_models = record_read_models
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+        self.checkpointer = None
+        self.graph = None
+        self._loop = None
+        self._start_lock = None
+        self._setup_done = False
+
+    async def start(self):
+        """Open the pool, create the checkpoint tables and compile the graph."""
+        loop = asyncio.get_running_loop()
+        if self.graph is not None and self._loop is loop:
+            return self.graph
+
+        if self._start_lock is None or self._loop is not loop:
+            self._start_lock = asyncio.Lock()
+            self._loop = loop
+            self.graph = None
+        async with self._start_lock:
+            if self.graph is None:
+                await self._open()
+        return self.graph
+
+    async def _open(self):
+        # A pool left over from a previous (now closed) loop cannot be awaited
+        # from this one, so it is simply dropped and a fresh one is opened.
+        self.pool = AsyncConnectionPool(
+            conninfo=self.db_uri,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            kwargs=CONNECTION_KWARGS,
+            open=False,
+        )
+        await self.pool.open()
+
+        self.checkpointer = AsyncPostgresSaver(self.pool)
+        if not self._setup_done:
+            await self.checkpointer.setup()
+            if self.record_read_models:
+                await self._setup_read_models()
+            self._setup_done = True
+
+        self.graph = self.workflow.compile(checkpointer=self.checkpointer)
+
+    async def _setup_read_models(self):
+        """Create the tables the UI reads instead of replaying checkpoints."""
+        async with self.pool.connection() as conn:
+            await conn.execute(CONVERSATION_TABLES_SETUP)
+
+    def _turn_input(self, input_message):
+        return {"messages": [("human", input_message)], **self.turn_state()}
+
+    def _turn_stats(self, values):
+        return {key: values[key] for key in self.turn_state() if key in values}
+
+    async def record_turn(self, thread_id, input_message, answer, stats=None):
+        """Append the turn to conversation_messages and update the thread's sidebar entry."""
+        messages = [{"role": "human", "content": input_message}]
+        if answer:
+            messages.append({"role": "assistant", "content": answer, "stats": stats or {}})
+        if stats:
+            print(f"Turn stats for {thread_id}: {stats}")
+        if not self.record_read_models:
+            return
+        async with self.pool.connection() as conn:
+            async with conn.transaction():
+                await conn.execute(LOCK_CONVERSATION_THREAD, (thread_id,))
+                await conn.execute(APPEND_CONVERSATION_MESSAGES, (thread_id, thread_id, json.dumps(messages)))
+                await conn.execute(RECORD_THREAD_ACTIVITY, (thread_id, input_message))
+
+    async def first_turn(self, graph, config):
+        """Whether the thread has no messages yet, i.e. the question cannot depend on earlier turns."""
+        if self.answer_cache is None:
+            return False
+        state = await graph.aget_state(config)
+        return not state.values.get("messages")
+
+    async def cached_answer(self, input_message, first_turn):
+        # Follow-ups ("and February?") depend on the thread, so only opening questions are shared
+        if self.answer_cache is None or not first_turn:
+            return None
+        # Embedding the question is CPU work; keep it off the event loop
+        return await asyncio.to_thread(self.answer_cache.lookup, input_message)
+
+    async def cache_answer(self, values, first_turn):
+        if self.answer_cache is not None and first_turn and self.cache_when(values):
+            # Keyed on the question the nodes answered (the thread's first message)
+            question = values["messages"][0].content
+            await asyncio.to_thread(self.answer_cache.store, question, values["messages"][-1].content)
+
+    async def record_cached_turn(self, graph, config, thread_id, input_message, answer):
+        """Add a cached answer to the thread's checkpoint and transcript without running any node."""
+        values = {
+            **self.turn_state(),
+            "messages": [HumanMessage(content=input_message), AIMessage(content=answer)],
+        }
+        await graph.aupdate_state(config, values, as_node=self.answer_node)
+        await self.record_turn(thread_id, input_message, answer, {**self._turn_stats(values), "answer_cache_hit": True})
+        return (await graph.aget_state(config)).values
+
+    async def close(self):
+        """Close the connection pool. The runtime can be started again afterwards."""
+        if self.pool is not None:
+            await self.pool.close()
+        self.pool = None
+        self.checkpointer = None
+        self.graph = None
+        self._loop = None
+        self._start_lock = None
+
+    async def ainvoke(self, input_message, thread_id):
+        graph = await self.start()
+        # The `thread_id` here will ensure the state is saved and reused for that conversation.
+        config = {"configurable": {"thread_id": thread_id}}
+        first_turn = await self.first_turn(graph, config)
+        answer = await self.cached_answer(input_message, first_turn)
+        if answer is not None:
+            return await self.record_cached_turn(graph, config, thread_id, input_message, answer)
+        result = await graph.ainvoke(self._turn_input(input_message), config)
+        await self.record_turn(thread_id, input_message, result["messages"][-1].content, self._turn_stats(result))
+        await self.cache_answer(result, first_turn)
+        return result
+
+    async def astream(self, input_message, thread_id, stream_nodes=STREAM_NODES):
+        """
+        Run one turn and yield events as they happen.
+
+        Yields dicts with a "type" key:
+            {"type": "node", "node": name}                   a graph node started
+            {"type": "token", "node": name, "content": str}  an LLM token from one of `stream_nodes`
+            {"type": "final", "content": str}                the turn's final answer (always last)
+        """
+        graph = await self.start()
+        config = {"configurable": {"thread_id": thread_id}}
+        first_turn = await self.first_turn(graph, config)
+        answer = await self.cached_answer(input_message, first_turn)
+        if answer is not None:
+            yield {"type": "node", "node": "answer_cache"}
+            await self.record_cached_turn(graph, config, thread_id, input_message, answer)
+            yield {"type": "final", "content": answer}
+            return
+
+        events = graph.astream_events(self._turn_input(input_message), config, version="v2")
+        async for event in events:
+            node = event.get("metadata", {}).get("langgraph_node")
+            if event["event"] == "on_chain_start" and event["name"] == node:
+                yield {"type": "node", "node": node}
+            elif event["event"] == "on_chat_model_stream" and node in stream_nodes:
+                content = event["data"]["chunk"].content
+                if content:
+                    yield {"type": "token", "node": node, "content": content}
+
+        state = await graph.aget_state(config)
+        answer = state.values["messages"][-1].content
+        await self.record_turn(thread_id, input_message, answer, self._turn_stats(state.values))
+        await self.cache_answer(state.values, first_turn)
+        yield {"type": "final", "content": answer}